@@ -0,0 +1,136 @@
+#! /usr/bin/python3
+
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from machine import booted_machine, machine
+from optparse import OptionParser
+from snapshot import REGISTERS
+from tap import LOAD_KEYS
+from typing import Optional
+
+# booted machine of this worker process, each job runs on a fork of it
+base: Optional[machine] = None
+
+def init_worker(rom_file: str, cold_boot: bool) -> None:
+    global base
+
+    base = booted_machine(rom_file, cold_boot=cold_boot)
+
+def type_keys(m: machine, keys, hold: int = 3, gap: int = 6) -> None:
+    """Presses each entry of 'keys' (a tuple of (half-row, bit)) for 'hold'
+    frames, then releases it for 'gap' frames (the ROM only sees a repeated
+    key after it was released for 5 frames)."""
+    for combination in keys:
+        for row, bit in combination:
+            m.dk.key(row, bit, True)
+
+        m.run_frames(hold)
+
+        for row, bit in combination:
+            m.dk.key(row, bit, False)
+
+        m.run_frames(gap)
+
+def run_job(file: str, frames: int, until_pc: Optional[int], until: Optional[str]) -> dict:
+    """Runs one image for at most 'frames' frames, or until PC is until_pc,
+    or until the expression 'until' (evaluated after every frame, with cpu,
+    peek and frame) is true."""
+    started = time.perf_counter()
+    result = { 'file': file }
+
+    try:
+        m = base.fork()
+
+        # every image starts at frame 0 in the first flash phase, whatever
+        # the base machine did (snapshots and .state files set their own)
+        m.dk.frame_nr = 0
+        m.dk.flash = 0
+
+        if file.lower().endswith('.tap'):
+            m.insert_tape(file)
+            type_keys(m, LOAD_KEYS)
+        else:
+            m.load(file)
+
+        condition = compile(until, 'until', 'eval') if until else None
+        first = m.dk.frame_nr
+        end = first + frames
+        reason = 'frames'
+
+        while m.dk.frame_nr < end:
+            frame_nr = m.dk.frame_nr
+
+            if until_pc is None:
+                m.run_frames(1)
+            else:
+                m.step()
+
+                if m.cpu.pc == until_pc:
+                    reason = 'pc'
+                    break
+
+            if condition and m.dk.frame_nr != frame_nr and eval(condition, { 'cpu': m.cpu, 'peek': m.read_mem, 'frame': m.dk.frame_nr - first }):
+                reason = 'condition'
+                break
+
+        took = time.perf_counter() - started
+
+        result['stopped'] = reason
+        result['screen'] = m.screen_hash()
+        result['registers'] = { name: getattr(m.cpu, name) for name in REGISTERS }
+        result['frames'] = m.dk.frame_nr - first
+        result['seconds'] = took
+        result['fps'] = result['frames'] / took if took > 0 else 0
+
+    except Exception as e:
+        result['stopped'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['seconds'] = time.perf_counter() - started
+
+    return result
+
+def main() -> None:
+    parser = OptionParser(usage='%prog -r ROM [options] image.sna|image.z80|image.tap ...')
+    parser.add_option('-r', '--rom', dest='rom_file', help='select ROM')
+    parser.add_option('-c', '--cold-boot', dest='cold_boot', action='store_true', default=False, help='boot the ROM instead of restoring its cached post-boot state')
+    parser.add_option('-n', '--frames', dest='frames', type='int', default=250, help='frames to run each image for (at most)')
+    parser.add_option('-p', '--until-pc', dest='until_pc', help='stop when PC reaches this (hexadecimal) address')
+    parser.add_option('-u', '--until', dest='until', help='stop when this Python expression (of cpu, peek(address) and frame) is true after a frame')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=os.cpu_count(), help='number of worker processes')
+    parser.add_option('-o', '--output', dest='output', help='write the results as JSON to this file')
+    (options, args) = parser.parse_args()
+
+    if not options.rom_file:
+        print('No BIOS/BASIC ROM selected (e.g. 48.rom)')
+        sys.exit(1)
+
+    until_pc = int(options.until_pc, 16) if options.until_pc else None
+
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(options.jobs, initializer=init_worker, initargs=(options.rom_file, options.cold_boot)) as pool:
+        futures = [ pool.submit(run_job, file, options.frames, until_pc, options.until) for file in args ]
+        results = [ f.result() for f in futures ]
+
+    for r in results:
+        if r['stopped'] == 'error':
+            print(f"{r['file']}: {r['error']}")
+        else:
+            print(f"{r['file']}: screen {r['screen'][:16]} PC {r['registers']['pc']:04x} after {r['frames']} frames ({r['stopped']}), {r['fps']:.1f} frames/s")
+
+    took = time.perf_counter() - started
+    frames = sum(r.get('frames', 0) for r in results)
+    print(f'{len(results)} images, {frames} frames in {took:.1f}s: {frames / took:.1f} frames/s')
+
+    if options.output:
+        with open(options.output, 'w') as fh:
+            json.dump(results, fh, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import numpy as np
+import sys
+import wave
+from typing import Optional
+
+CPU_HZ: int = 3500000
+FRAME_CYCLES: int = 69888
+
+# output level of a high EAR bit, of 32767
+VOLUME: int = 8192
+
+def synthesize(start: int, log: list, position: float, carry: float, step: float) -> tuple:
+    """Converts one frame of EAR changes (level at the start of the frame,
+    T-states at which it toggled) to samples of 'step' T-states each.
+    Every sample is the mean level over its period (a box filter), taken
+    from the running sum of the level per T-state. 'position' is where the
+    first sample ends and 'carry' what the previous frame contributed to
+    it. Returns the samples (0...1) and the position and carry for the
+    next frame."""
+    times = np.clip(np.array(log, dtype=np.intp), 0, FRAME_CYCLES - 1)
+
+    # the level toggles at every change: it is the parity of the number of
+    # changes so far
+    level = (np.cumsum(np.bincount(times, minlength=FRAME_CYCLES)) + start) & 1
+    area = np.concatenate(([ 0 ], np.cumsum(level)))
+
+    # area up to the (fractional) end of each sample in this frame
+    ends = np.arange(position, FRAME_CYCLES, step)
+    index = ends.astype(np.intp)
+    at = area[index] + (ends - index) * level[index]
+
+    samples = np.diff(at, prepend=-carry) / step
+
+    if len(ends):
+        carry = area[-1] - at[-1]
+        position = ends[-1] + step - FRAME_CYCLES
+    else:
+        carry += area[-1]
+        position -= FRAME_CYCLES
+
+    return samples, position, carry
+
+class beeper:
+    """Plays the sound of the beeper (bit 4 of port 0xfe) through
+    pygame.mixer (target None), or writes it to a .wav file or a file
+    of raw signed 16 bit mono samples ('-' is the process' stdout, also
+    when sys.stdout was redirected). The samples are synthesized at the
+    end of every frame from the EAR changes the ULA logged, at a cost
+    that does not depend on their number."""
+
+    def __init__(self, target: Optional[str] = None, rate: int = 44100):
+        self.wav = None
+        self.fh = None
+        self.channel = None
+        self.channels = 1
+
+        if target is None:
+            import pygame
+
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(frequency=rate, size=-16, channels=1, buffer=1024)
+
+            # the device may have been opened with other settings
+            rate, _, self.channels = pygame.mixer.get_init()
+            self.channel = pygame.mixer.Channel(0)
+
+        elif target.lower().endswith('.wav'):
+            self.wav = wave.open(target, 'wb')
+            self.wav.setnchannels(1)
+            self.wav.setsampwidth(2)
+            self.wav.setframerate(rate)
+
+        else:
+            self.fh = sys.__stdout__.buffer if target == '-' else open(target, 'wb')
+
+        self.rate = rate
+        self.step = CPU_HZ / rate
+        self.position = self.step
+        self.carry = 0.0
+
+        self.n_samples = 0
+        self.dropped = 0
+
+    def frame(self, dk) -> None:
+        """Outputs the samples of the frame ULA 'dk' just completed."""
+        start, log = dk.ear_frame
+        samples, self.position, self.carry = synthesize(start, log, self.position, self.carry, self.step)
+
+        pcm = np.round(samples * VOLUME).astype('<i2')
+        self.n_samples += len(pcm)
+
+        if self.wav:
+            self.wav.writeframes(pcm.tobytes())
+
+        elif self.fh:
+            self.fh.write(pcm.tobytes())
+
+        else:
+            self.play(pcm)
+
+    def play(self, pcm: np.ndarray) -> None:
+        import pygame
+
+        if self.channels > 1:
+            pcm = np.repeat(pcm, self.channels)
+
+        sound = pygame.mixer.Sound(buffer=pcm.tobytes())
+
+        if not self.channel.get_busy():
+            self.channel.play(sound)
+
+        elif self.channel.get_queue() is None:
+            self.channel.queue(sound)
+
+        else:
+            # emulation is ahead of the sound device (e.g. turbo mode)
+            self.dropped += 1
+
+    def close(self) -> None:
+        if self.wav:
+            self.wav.close()
+
+        elif self.fh:
+            self.fh.flush()
+
+            if self.fh is not sys.__stdout__.buffer:
+                self.fh.close()
+
+        else:
+            self.channel.stop()
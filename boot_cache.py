@@ -0,0 +1,65 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import os
+import struct
+import sys
+from state import load_state, save_state
+
+# MAIN-1 of the 48k ROM: initialisation is done, the copyright message is
+# on the screen and the editor is about to be started
+ROM_READY: int = 0x12a9
+
+# the 48k ROM gets there after 84 frames; other ROMs may never, they are
+# booted normally (and not cached) when this many frames have passed
+BOOT_FRAMES: int = 200
+
+def cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'pyzxspectrum')
+
+def cache_file(rom_hash: str) -> str:
+    return os.path.join(cache_dir(), f'boot-{rom_hash}.state')
+
+def restore(rom_hash: str, cpu, dk, ram_) -> bool:
+    """Puts the machine in the state the ROM with this hash had after
+    booting, if that was stored before. The complete state is kept (frame
+    number, flash phase, T-states into the frame...), a restored machine
+    continues exactly as one that booted. A file that cannot be read is
+    removed, the ROM is then booted again."""
+    file = cache_file(rom_hash)
+    if not os.path.exists(file):
+        return False
+
+    try:
+        with open(file, 'rb') as fh:
+            load_state(cpu, dk, ram_, fh.read())
+
+    except (OSError, struct.error, AssertionError, ValueError) as e:
+        print(f'Ignoring boot state {file}: {e}', file=sys.stderr)
+
+        try:
+            os.unlink(file)
+        except OSError:
+            pass
+
+        return False
+
+    return True
+
+def store(rom_hash: str, cpu, dk, ram_) -> None:
+    file = cache_file(rom_hash)
+
+    try:
+        os.makedirs(cache_dir(), exist_ok=True)
+
+        # write to a temporary file first so that concurrent instances
+        # never see a partial state
+        temp = f'{file}.{os.getpid()}'
+        with open(temp, 'wb') as fh:
+            fh.write(save_state(cpu, dk, ram_))
+
+        os.replace(temp, file)
+
+    except OSError as e:
+        print(f'Cannot store boot state in {file}: {e}', file=sys.stderr)
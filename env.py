@@ -0,0 +1,167 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import multiprocessing
+import numpy as np
+from machine import booted_machine, machine
+from multiprocessing import shared_memory
+from renderer import FRAME_H, FRAME_W, renderer
+from typing import Callable, List, Optional, Tuple
+
+class vector_env:
+    """n headless machines stepped one frame at a time. An action is the
+    set of pressed keys of one machine: 8 bytes with the pressed bits per
+    half-row, as in ula.keys. The observations are one (n, 240, 320) array
+    of palette indices (see renderer.py) that the renderers draw into
+    directly; it is returned by reference, not copied.
+
+    reward(machine) and done(machine) are optional: a machine that is done
+    is reset at the end of that step."""
+
+    def __init__(self, rom_file: str, n: int, start: Optional[str] = None,
+                 reward: Optional[Callable[[machine], float]] = None, done: Optional[Callable[[machine], bool]] = None,
+                 obs: Optional[np.ndarray] = None, cold_boot: bool = False):
+        self.n = n
+        self.reward = reward
+        self.done = done
+
+        self.obs = np.zeros((n, FRAME_H, FRAME_W), dtype=np.uint8) if obs is None else obs
+        assert self.obs.shape == (n, FRAME_H, FRAME_W)
+
+        self.renderers = [ renderer(self.obs[i]) for i in range(n) ]
+
+        # ULA generation each observation was rendered from
+        self.generations: List[Optional[int]] = [ None ] * n
+
+        # every instance starts as a copy-on-write fork of this one
+        self.base = booted_machine(rom_file, start, cold_boot)
+        self.machines: List[machine] = [ self.base.fork() for i in range(n) ]
+
+    def render(self, i: int) -> None:
+        dk = self.machines[i].dk
+        if dk.generation == self.generations[i]:
+            return
+
+        self.renderers[i].render(dk.ram, dk.flash)
+        self.renderers[i].render_border(dk.border, [])
+        self.generations[i] = dk.generation
+
+    def reset(self) -> np.ndarray:
+        for i in range(self.n):
+            self.machines[i] = self.base.fork()
+            self.generations[i] = None
+            self.render(i)
+
+        return self.obs
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Runs one frame on every machine with the keys of actions[i]
+        pressed, returns the observations, rewards and done flags."""
+        rewards = np.zeros(self.n, dtype=np.float32)
+        dones = np.zeros(self.n, dtype=bool)
+
+        for i, m in enumerate(self.machines):
+            if actions is not None:
+                m.dk.set_keys(actions[i])
+
+            m.run_frames(1)
+
+            if self.reward:
+                rewards[i] = self.reward(m)
+
+            if self.done and self.done(m):
+                dones[i] = True
+                self.machines[i] = self.base.fork()
+                self.generations[i] = None
+
+            self.render(i)
+
+        return self.obs, rewards, dones
+
+    def close(self) -> None:
+        pass
+
+def worker(conn, shm_name: str, n: int, lo: int, hi: int, rom_file: str, start: Optional[str], reward, done, cold_boot: bool) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    try:
+        obs = np.ndarray((n, FRAME_H, FRAME_W), dtype=np.uint8, buffer=shm.buf)
+        env = vector_env(rom_file, hi - lo, start, reward, done, obs[lo:hi], cold_boot)
+
+        while True:
+            command, actions = conn.recv()
+
+            if command == 'reset':
+                env.reset()
+                conn.send(None)
+
+            elif command == 'step':
+                _, rewards, dones = env.step(actions)
+                conn.send((rewards, dones))
+
+            else:
+                break
+
+        del obs, env
+
+    finally:
+        shm.close()
+
+class shared_vector_env:
+    """vector_env spread over worker processes: every worker steps its own
+    range of the machines in parallel and renders into a shared memory
+    block that is the observation array of this process. reward() and
+    done() must be picklable (e.g. module level functions)."""
+
+    def __init__(self, rom_file: str, n: int, workers: int, start: Optional[str] = None,
+                 reward: Optional[Callable[[machine], float]] = None, done: Optional[Callable[[machine], bool]] = None,
+                 cold_boot: bool = False):
+        assert 1 <= workers <= n
+
+        self.n = n
+        self.shm = shared_memory.SharedMemory(create=True, size=n * FRAME_H * FRAME_W)
+        self.obs = np.ndarray((n, FRAME_H, FRAME_W), dtype=np.uint8, buffer=self.shm.buf)
+        self.obs[:] = 0
+
+        self.ranges = [ (n * w // workers, n * (w + 1) // workers) for w in range(workers) ]
+        self.conns = []
+        self.processes = []
+
+        for lo, hi in self.ranges:
+            parent, child = multiprocessing.Pipe()
+            p = multiprocessing.Process(target=worker, args=(child, self.shm.name, n, lo, hi, rom_file, start, reward, done, cold_boot), daemon=True)
+            p.start()
+
+            self.conns.append(parent)
+            self.processes.append(p)
+
+    def reset(self) -> np.ndarray:
+        for conn in self.conns:
+            conn.send(('reset', None))
+
+        for conn in self.conns:
+            conn.recv()
+
+        return self.obs
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        for conn, (lo, hi) in zip(self.conns, self.ranges):
+            conn.send(('step', None if actions is None else np.asarray(actions, dtype=np.uint8)[lo:hi]))
+
+        replies = [ conn.recv() for conn in self.conns ]
+
+        rewards = np.concatenate([ r for r, d in replies ])
+        dones = np.concatenate([ d for r, d in replies ])
+
+        return self.obs, rewards, dones
+
+    def close(self) -> None:
+        for conn in self.conns:
+            conn.send(('close', None))
+
+        for p in self.processes:
+            p.join()
+
+        del self.obs
+        self.shm.close()
+        self.shm.unlink()
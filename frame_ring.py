@@ -0,0 +1,73 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import threading
+from typing import List, Optional
+
+class frame_slot:
+    def __init__(self):
+        self.vram = bytearray(0x1b00)
+        self.log: List[tuple] = []
+        self.border: int = 0
+        self.border_log: List[tuple] = []
+        self.flash: int = 0
+        self.frame_nr: int = 0
+
+class frame_ring:
+    """Hands completed frames from the emulation thread to a render thread.
+    The producer never waits: it always writes into a slot that is not
+    being rendered, dropping the pending frame if the renderer is behind."""
+
+    def __init__(self, n: int = 3):
+        assert n >= 2
+        self.slots = [ frame_slot() for i in range(n) ]
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.ready: Optional[int] = None
+        self.reading: Optional[int] = None
+        self.dropped: int = 0
+
+    def publish(self, vram, log: list, border: int, border_log: list, flash: int, frame_nr: int) -> None:
+        with self.lock:
+            idx = None
+            for i in range(len(self.slots)):
+                if i != self.reading and i != self.ready:
+                    idx = i
+                    break
+
+            if idx is None:
+                idx = self.ready
+
+            if self.ready is not None:
+                self.ready = None
+                self.dropped += 1
+
+        slot = self.slots[idx]
+        slot.vram[:] = vram
+        slot.log = log
+        slot.border = border
+        slot.border_log = border_log
+        slot.flash = flash
+        slot.frame_nr = frame_nr
+
+        with self.lock:
+            self.ready = idx
+            self.event.set()
+
+    def get(self, timeout: float) -> Optional[frame_slot]:
+        self.event.wait(timeout)
+
+        with self.lock:
+            self.event.clear()
+
+            if self.ready is None:
+                return None
+
+            self.reading = self.ready
+            self.ready = None
+
+            return self.slots[self.reading]
+
+    def release(self) -> None:
+        with self.lock:
+            self.reading = None
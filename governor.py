@@ -0,0 +1,52 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import time
+
+class governor:
+    """Keeps emulation at the real frame rate of the machine: sleeps when
+    ahead, skips rendering (never emulation) when behind. In turbo mode
+    emulation runs unthrottled and only every render_divisor'th frame is
+    rendered."""
+
+    def __init__(self, hz: float, turbo: bool = False, render_divisor: int = 1, max_skip: int = 5):
+        assert render_divisor >= 1
+
+        self.period: float = 1.0 / hz
+        self.turbo = turbo
+        self.render_divisor = render_divisor
+        self.max_skip = max_skip
+
+        self.frame_nr: int = 0
+        self.skipped: int = 0
+        self.next: float = time.perf_counter() + self.period
+
+    def frame(self) -> bool:
+        """To be invoked at the end of every emulated frame, returns whether
+        that frame should be rendered."""
+        self.frame_nr += 1
+
+        render = self.frame_nr % self.render_divisor == 0
+
+        if self.turbo:
+            return render
+
+        now = time.perf_counter()
+        ahead = self.next - now
+        self.next += self.period
+
+        if ahead > 0:
+            time.sleep(ahead)
+
+        elif -ahead > self.period * 10:
+            # too far behind to ever catch up, continue from here
+            self.next = now + self.period
+
+        elif -ahead > self.period and render and self.skipped < self.max_skip:
+            self.skipped += 1
+            return False
+
+        if render:
+            self.skipped = 0
+
+        return render
@@ -0,0 +1,385 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import boot_cache
+import copy
+import hashlib
+import os
+import pickle
+import sys
+from governor import governor
+from ram import ram
+from rom import rom
+from screen_null import screen_null
+from sna import save_sna
+from snapshot import REGISTERS, capture
+from snapshot_cache import load_snapshot
+from state import load_state_file, save_state_file
+from tap import LD_BYTES, load_tap, tape
+from text import UDG, charset, text_screen
+from typing import Any, Callable, Dict, Optional
+from ula import EV_QUIT, ula
+from z80 import z80
+from z80_snapshot import save_z80
+
+# frames per second of a 48k machine: 3.5MHz, 69888 T-states per frame
+HZ: float = 3500000 / 69888
+
+# complete CPU state: the registers of a snapshot and the internal ones
+CPU_STATE = REGISTERS + ( 'memptr', 'int', 'interrupt_cycles' )
+
+# attributes as shown in the second flash phase: ink and paper swapped for
+# those with FLASH set
+FLASH_SWAPPED = bytes((a & 0xc0) | ((a & 7) << 3) | ((a >> 3) & 7) if a & 0x80 else a for a in range(256))
+
+class branch:
+    """A machine running in a child process, see machine.fork_process()."""
+
+    def __init__(self, pid: int, fd: int):
+        self.pid = pid
+        self.fd = fd
+
+    def result(self) -> Any:
+        """Waits for the child and returns what the job returned, or raises
+        what it raised. Can be invoked once."""
+        with os.fdopen(self.fd, 'rb') as fh:
+            data = fh.read()
+
+        os.waitpid(self.pid, 0)
+
+        if not data:
+            raise ChildProcessError(f'branch {self.pid} ended without a result')
+
+        ok, value = pickle.loads(data)
+        if not ok:
+            raise value
+
+        return value
+
+class machine:
+    """A 48k Spectrum: CPU, ROM, RAM and ULA connected through the memory
+    map and I/O ports."""
+
+    def __init__(self, rom_file: str, display=None, turbo: bool = False, render_divisor: int = 1, accurate: bool = False, debug=None):
+        self.debug = debug if debug else lambda x: None
+
+        self.rom = rom(rom_file, self.debug, 0x0000)
+        self.ram_ = ram(self.debug)
+        self.dk = ula(display if display else screen_null(), governor(HZ, turbo, render_divisor), accurate)
+
+        # handlers that replace ROM routines, by address; they are invoked
+        # with the machine
+        self.traps: Dict[int, Callable[['machine'], None]] = {}
+
+        # inserted .TAP image, read by the LD-BYTES trap
+        self.tape: Optional[tape] = None
+
+        self.stop_flag = False
+        self.boot_pending = False
+
+        # closing the window (or Ctrl-C in the terminal) ends run()
+        self.dk.hotkeys[EV_QUIT] = self.stop
+
+        # screen_hash() of ULA generation hash_generation
+        self.hash = None
+        self.hash_generation = None
+
+        # screen_text() (without UDGs) of ULA generation text_generation
+        self.text: Optional[text_screen] = None
+        self.text_lines = None
+        self.text_generation = None
+
+        self.connect()
+
+    def connect(self) -> None:
+        self.cpu = z80(self.read_mem, self.write_mem, self.read_io, self.write_io, True, self.debug, self.dk)
+        self.dk.cpu = self.cpu
+
+    def read_mem(self, a: int) -> int:
+        assert a >= 0
+        assert a < 0x10000
+
+        if a < 0x4000:  # ROM
+            return self.rom.read_mem(a)
+
+        if a < 0x5b00:  # Video RAM
+            return self.dk.read_mem(a)
+
+        return self.ram_.read_mem(a)
+
+    def write_mem(self, a: int, v: int) -> None:
+        assert a >= 0
+        assert a < 0x10000
+
+        if a < 0x4000:  # ROM
+            return  # cannot write ROM
+
+        if a < 0x5b00:  # Video RAM
+            self.dk.write_mem(a, v)
+            return
+
+        self.ram_.write_mem(a, v)
+
+    def read_io(self, a: int) -> int:
+        value = 0
+
+        if (a & 1) == 0:
+            value = self.dk.read_io(a)
+        else:
+            print('I/O read %04x: %02x' % (a, value))
+
+        return value
+
+    def write_io(self, a: int, v: int) -> None:
+        if (a & 1) == 0:
+            self.dk.write_io(a, v)
+
+    def boot(self, cold_boot: bool = False) -> None:
+        """Continues from the cached post-boot state of the ROM, or lets run()
+        boot the ROM (and cache that state) when there is none."""
+        self.boot_pending = cold_boot or not boot_cache.restore(self.rom.sha256, self.cpu, self.dk, self.ram_)
+
+    def load(self, file: str) -> None:
+        """Loads a .SNA, .Z80 or .state file."""
+        if file.lower().endswith('.state'):
+            load_state_file(file, self.cpu, self.dk, self.ram_)
+            return
+
+        snapshot = load_snapshot(file)
+
+        if snapshot.model != '48k':
+            print(f'{file} is a {snapshot.model} snapshot, only its 48k view is loaded', file=sys.stderr)
+
+        snapshot.apply(self.cpu, self.dk, self.ram_)
+
+    def save(self, file: str) -> None:
+        """Writes a .state, .Z80 or (any other extension) .SNA file."""
+        if file.lower().endswith('.state'):
+            save_state_file(file, self.cpu, self.dk, self.ram_)
+        elif file.lower().endswith('.z80'):
+            save_z80(file, capture(self.cpu, self.dk, self.ram_))
+        else:
+            save_sna(file, capture(self.cpu, self.dk, self.ram_))
+
+    def boot_rom(self) -> None:
+        """Runs the ROM until its initialisation is done and caches the
+        resulting state. A ROM that does not get to ROM_READY within
+        BOOT_FRAMES frames just keeps running, uncached."""
+        end = self.dk.frame_nr + boot_cache.BOOT_FRAMES
+
+        while not self.stop_flag and self.cpu.pc != boot_cache.ROM_READY and self.dk.frame_nr < end:
+            self.cpu.step()
+
+        if self.cpu.pc == boot_cache.ROM_READY:
+            boot_cache.store(self.rom.sha256, self.cpu, self.dk, self.ram_)
+
+        elif not self.stop_flag:
+            print(f'ROM did not get to {boot_cache.ROM_READY:04x} in {boot_cache.BOOT_FRAMES} frames, its boot is not cached', file=sys.stderr)
+
+        self.boot_pending = False
+
+    def insert_tape(self, file: str) -> None:
+        """Makes the blocks of a .TAP file available to the LOAD command."""
+        self.tape = tape(load_tap(file))
+        self.traps[LD_BYTES] = lambda m: m.tape.ld_bytes(m)
+
+    def share(self, name: Optional[str] = None, path: Optional[str] = None):
+        """Publishes the screen and memory after every frame in shared
+        memory or an mmap'd file, returns the shared_frame doing that."""
+        from shared_frame import shared_frame
+
+        s = shared_frame(name, path, self.rom.rom)
+        self.dk.frame_handlers.append(lambda: s.publish(self))
+
+        return s
+
+    def screen_bytes(self) -> memoryview:
+        """The 6912 byte display file (bitmap and attributes), not copied."""
+        return memoryview(self.dk.ram)
+
+    def screen_hash(self) -> str:
+        """Digest of the screen as it is shown now: in the second flash
+        phase flashing attributes count with ink and paper swapped. Screens
+        without FLASH have the same digest in both phases."""
+        dk = self.dk
+        if dk.generation == self.hash_generation and not dk.changed:
+            return self.hash
+
+        h = hashlib.sha256(memoryview(dk.ram)[0:0x1800])
+
+        attrs = dk.ram[0x1800:0x1b00]
+        h.update(attrs.translate(FLASH_SWAPPED) if dk.flash else attrs)
+
+        self.hash = h.hexdigest()
+        self.hash_generation = dk.generation
+
+        return self.hash
+
+    def screen_text(self, udg: Optional[str] = None) -> str:
+        """The characters on the screen, 24 lines of 32. Cells that are not
+        a character of the ROM (normal or inverted) or a block graphic are
+        '?'. With 'udg', the user defined graphics A...U are recognised
+        too and shown as the corresponding character of that string."""
+        dk = self.dk
+        if not udg and dk.generation == self.text_generation and not dk.changed:
+            return self.text_lines
+
+        glyphs = charset(self.rom.rom, self.rom.sha256)
+
+        if udg:
+            glyphs = dict(glyphs)
+            address = self.read_mem(UDG) | (self.read_mem(UDG + 1) << 8)
+
+            for i, c in enumerate(udg[0:21]):
+                glyph = bytes(self.read_mem((address + i * 8 + line) & 0xffff) for line in range(8))
+                glyphs.setdefault(glyph, c)
+                glyphs.setdefault(bytes(v ^ 0xff for v in glyph), c)
+
+        if self.text is None:
+            self.text = text_screen(glyphs)
+        else:
+            self.text.set_glyphs(glyphs)
+
+        lines = '\n'.join(self.text.decode(dk.ram))
+
+        self.text_lines = lines
+        self.text_generation = None if udg else dk.generation
+
+        return lines
+
+    def save_png(self, file: str) -> None:
+        """Writes the screen, with border, as a PNG."""
+        from png import save_png
+        from renderer import renderer, to_rgb
+
+        r = renderer()
+        r.render(self.dk.ram, self.dk.flash)
+        save_png(file, to_rgb(r.render_border(self.dk.border, [])))
+
+    def record(self, target: str):
+        """Records every frame from now on, see recorder.py; returns the
+        recorder, close() it when done."""
+        from recorder import recorder
+
+        r = recorder(target)
+        self.dk.frame_handlers.append(lambda: r.frame(self.dk))
+
+        return r
+
+    def sound(self, target: Optional[str] = None, rate: int = 44100):
+        """Plays (target None) or writes the beeper from now on, see
+        beeper.py; returns the beeper, close() it when done."""
+        from beeper import beeper
+
+        b = beeper(target, rate)
+        self.dk.frame_handlers.append(lambda: b.frame(self.dk))
+
+        return b
+
+    def step(self) -> None:
+        """Executes one instruction, or the trap for the current address."""
+        trap = self.traps.get(self.cpu.pc)
+        if trap:
+            trap(self)
+        else:
+            self.cpu.step()
+
+    def run(self) -> None:
+        """Emulates until stop() is invoked. When the emulation fails, the
+        machine state is written to crash.state first."""
+        try:
+            if self.boot_pending:
+                self.boot_rom()
+
+            step = self.step if self.traps else self.cpu.step
+            while not self.stop_flag:
+                step()
+
+        except Exception:
+            # keep what went wrong for later inspection (load it with -L)
+            save_state_file('crash.state', self.cpu, self.dk, self.ram_)
+            print('Machine state written to crash.state', file=sys.stderr)
+            raise
+
+    def stop(self) -> None:
+        self.stop_flag = True
+
+    def run_frames(self, n: int = 1) -> None:
+        step = self.step if self.traps else self.cpu.step
+
+        end = self.dk.frame_nr + n
+        while self.dk.frame_nr < end:
+            step()
+
+    def fork(self) -> 'machine':
+        """Returns an independent copy of this machine, headless and
+        unthrottled. The RAM pages are shared copy-on-write: a fork costs
+        the registers and the display file, not 48kB."""
+        child = copy.copy(self)
+        child.traps = dict(self.traps)
+        child.tape = copy.copy(self.tape)
+        child.ram_ = self.ram_.fork()
+        child.dk = self.dk.fork(screen_null(), governor(HZ, True))
+        child.hash_generation = None
+        child.text = None
+        child.text_generation = None
+        child.connect()
+
+        for name in CPU_STATE:
+            setattr(child.cpu, name, getattr(self.cpu, name))
+
+        return child
+
+    def fork_process(self, job: Callable[['machine'], Any]) -> branch:
+        """Runs job(machine) on a copy of this machine in a child process,
+        the operating system shares the memory copy-on-write. The result
+        must be picklable, collect it with result() of the returned
+        branch."""
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        r, w = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            status = 1
+
+            try:
+                os.close(r)
+
+                self.dk.display = screen_null()
+                self.dk.governor = governor(HZ, True)
+                self.dk.hotkeys = {}
+                self.dk.frame_handlers = []
+
+                try:
+                    result = (True, job(self))
+                except Exception as e:
+                    result = (False, e)
+
+                with os.fdopen(w, 'wb') as fh:
+                    pickle.dump(result, fh)
+
+                status = 0
+
+            finally:
+                os._exit(status)
+
+        os.close(w)
+
+        return branch(pid, r)
+
+def booted_machine(rom_file: str, start: Optional[str] = None, cold_boot: bool = False) -> machine:
+    """Returns a headless, unthrottled machine that booted the ROM (or,
+    unless cold_boot, restored that state from the boot cache), then loaded
+    'start' (a .SNA, .Z80 or .state file) when given."""
+    m = machine(rom_file, turbo=True)
+    m.boot(cold_boot)
+
+    if m.boot_pending:
+        m.boot_rom()
+
+    if start:
+        m.load(start)
+
+    return m
@@ -0,0 +1,28 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import numpy as np
+import struct
+import zlib
+
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def encode_png(rgb: np.ndarray, level: int = 6) -> bytes:
+    """Returns a (height, width, 3) RGB array as an 8 bit truecolour PNG."""
+    h, w, _ = rgb.shape
+
+    # every row starts with its filter type, 0 (none)
+    rows = np.zeros((h, 1 + w * 3), dtype=np.uint8)
+    rows[:, 1:] = rgb.reshape(h, w * 3)
+
+    return b''.join((SIGNATURE,
+                     chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0)),
+                     chunk(b'IDAT', zlib.compress(rows.tobytes(), level)),
+                     chunk(b'IEND', b'')))
+
+def save_png(file: str, rgb: np.ndarray) -> None:
+    with open(file, 'wb') as fh:
+        fh.write(encode_png(rgb))
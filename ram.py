@@ -2,13 +2,26 @@
 # released under MIT license
 
 import sys
-from typing import List
+from typing import List, Optional
+
+PAGE_SIZE: int = 0x4000
 
 class ram:
-    def __init__(self, debug):
+    """RAM as 16kB pages, 1...3 for 0x4000...0xffff (the display file at
+    0x4000...0x5aff is in the ULA, that part of page 1 is not used). Pages
+    can be shared with forks of this RAM, a shared page is copied on its
+    first write."""
+
+    def __init__(self, debug, pages: Optional[List[bytearray]] = None):
         self.base_address: int = 0x5b00
         self.debug = debug
-        self.ram = [ 0 for i in range(65536) ]
+
+        if pages is None:
+            self.pages: List[Optional[bytearray]] = [ None ] + [ bytearray(PAGE_SIZE) for i in range(3) ]
+            self.shared: List[bool] = [ False ] * 4
+        else:
+            self.pages = list(pages)
+            self.shared = [ False ] + [ True ] * 3
 
     def get_ios(self):
         return [ [ ] , [ ] ]
@@ -16,11 +29,33 @@ class ram:
     def get_name(self):
         return 'RAM'
 
+    def fork(self) -> 'ram':
+        """Returns a RAM with the same contents, sharing all pages."""
+        self.shared = [ False ] + [ True ] * 3
+        return ram(self.debug, self.pages)
+
+    def load(self, data: bytes) -> None:
+        """Replaces all of 0x5b00...0xffff."""
+        assert len(data) == 0x10000 - self.base_address
+        mem = bytes(self.base_address - PAGE_SIZE) + bytes(data)
+        self.pages = [ None ] + [ bytearray(mem[i:i + PAGE_SIZE]) for i in range(0, 0xc000, PAGE_SIZE) ]
+        self.shared = [ False ] * 4
+
+    def dump(self) -> bytes:
+        """Returns 0x5b00...0xffff."""
+        return b''.join((memoryview(self.pages[1])[self.base_address - PAGE_SIZE:], self.pages[2], self.pages[3]))
+
     def write_mem(self, a: int, v: int) -> None:
         assert v >= 0 and v < 256
-        assert a >= 0 and a < 65536
-        self.ram[a - self.base_address] = v
+        assert a >= self.base_address and a < 65536
+        page = a >> 14
+
+        if self.shared[page]:
+            self.pages[page] = bytearray(self.pages[page])
+            self.shared[page] = False
+
+        self.pages[page][a & 0x3fff] = v
 
     def read_mem(self, a: int) -> int:
-        assert a >= 0 and a < 65536
-        return self.ram[a - self.base_address]
+        assert a >= self.base_address and a < 65536
+        return self.pages[a >> 14][a & 0x3fff]
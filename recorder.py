@@ -0,0 +1,110 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import numpy as np
+import queue
+import sys
+import threading
+from png import encode_png
+from renderer import FRAME_H, FRAME_W, PALETTE_RGB, renderer, to_rgb
+
+# BT.601 (limited range) Y, Cb and Cr per palette index
+_rgb = PALETTE_RGB.astype(np.float64)
+Y_LUT = np.round(16 + (65.481 * _rgb[:, 0] + 128.553 * _rgb[:, 1] + 24.966 * _rgb[:, 2]) / 255).astype(np.uint8)
+CB_LUT = 128 + (-37.797 * _rgb[:, 0] - 74.203 * _rgb[:, 1] + 112.0 * _rgb[:, 2]) / 255
+CR_LUT = 128 + (112.0 * _rgb[:, 0] - 93.786 * _rgb[:, 1] - 18.214 * _rgb[:, 2]) / 255
+
+def to_y4m_frame(frame: np.ndarray) -> bytes:
+    """Converts a frame of palette indices to one 4:2:0 Y4M frame."""
+    h, w = frame.shape
+
+    def subsample(lut: np.ndarray) -> np.ndarray:
+        return np.round(lut[frame].reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))).astype(np.uint8)
+
+    return b''.join((b'FRAME\n', Y_LUT[frame].tobytes(), subsample(CB_LUT).tobytes(), subsample(CR_LUT).tobytes()))
+
+class recorder:
+    """Records every frame of a machine: to a Y4M stream (a .y4m file, or
+    stdout for target '-'), to raw RGB24 frames (a .rgb or .raw file) or
+    to numbered PNGs (a .png target, with a %d for the number or else the
+    number is appended to the name). Stdout is the process' own, also when
+    sys.stdout was redirected to keep messages out of the stream. The
+    emulation thread only queues the display file and border, rendering,
+    encoding and writing is done by a writer thread."""
+
+    def __init__(self, target: str):
+        lower = target.lower()
+
+        if lower.endswith('.png'):
+            self.kind = 'png'
+            self.pattern = target if '%' in target else f'{target[:-4]}-%06d.png'
+            self.fh = None
+
+        else:
+            self.kind = 'raw' if lower.endswith('.rgb') or lower.endswith('.raw') else 'y4m'
+            self.fh = sys.__stdout__.buffer if target == '-' else open(target, 'wb')
+
+            if self.kind == 'y4m':
+                # 50.08Hz: 3.5MHz / 69888 T-states per frame
+                self.fh.write(f'YUV4MPEG2 W{FRAME_W} H{FRAME_H} F3500000:69888 Ip A1:1 C420jpeg\n'.encode('ascii'))
+
+        self.renderer = renderer()
+        self.n_frames = 0
+        self.generation = None
+
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def frame(self, dk) -> None:
+        """Queues the current frame of ULA 'dk', never waits for the writer.
+        An unchanged frame is queued as None: repeat the previous one."""
+        if dk.generation == self.generation:
+            self.queue.put(None)
+            return
+
+        self.generation = dk.generation
+        self.queue.put((bytes(dk.ram), dk.border, dk.flash))
+
+    def encode(self, vram: bytes, border: int, flash: int) -> bytes:
+        self.renderer.render(vram, flash)
+        frame = self.renderer.render_border(border, [])
+
+        if self.kind == 'y4m':
+            return to_y4m_frame(frame)
+
+        if self.kind == 'raw':
+            return to_rgb(frame).tobytes()
+
+        return encode_png(to_rgb(frame))
+
+    def writer(self) -> None:
+        data = None
+
+        while True:
+            item = self.queue.get()
+            if item is False:
+                break
+
+            # static screens are encoded once
+            if item is not None:
+                data = self.encode(*item)
+
+            if self.kind == 'png':
+                with open(self.pattern % self.n_frames, 'wb') as fh:
+                    fh.write(data)
+            else:
+                self.fh.write(data)
+
+            self.n_frames += 1
+
+        if self.fh:
+            self.fh.flush()
+
+    def close(self) -> None:
+        """Writes what is still queued and closes the output."""
+        self.queue.put(False)
+        self.thread.join()
+
+        if self.fh and self.fh is not sys.__stdout__.buffer:
+            self.fh.close()
@@ -0,0 +1,129 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import numpy as np
+from typing import List, Optional, Tuple
+
+# 48K ULA timing: the first display pixel is fetched 14336 T-states after
+# the interrupt, every scanline takes 224 T-states
+T_LINE: int = 224
+T_FIRST_PIXEL: int = 14336
+
+# visible border around the 256x192 display area
+BORDER_W: int = 32
+BORDER_H: int = 24
+FRAME_W: int = 256 + 2 * BORDER_W
+FRAME_H: int = 192 + 2 * BORDER_H
+
+# RGB per palette index, 0...7 normal and 8...15 bright
+PALETTE = (
+        (0x00, 0x00, 0x00),
+        (0x01, 0x00, 0xce),
+        (0xcf, 0x01, 0x00),
+        (0xcf, 0x01, 0xce),
+        (0x00, 0xcf, 0x15),
+        (0x00, 0xcf, 0xcf),
+        (0xcf, 0xcf, 0x15),
+        (0xcf, 0xcf, 0xcf),
+        (0x00, 0x00, 0x00),
+        (0x02, 0x00, 0xfd),
+        (0xff, 0x02, 0x01),
+        (0xff, 0x02, 0xfd),
+        (0x00, 0xff, 0x1c),
+        (0x02, 0xff, 0xff),
+        (0xff, 0xff, 0x1d),
+        (0xff, 0xff, 0xff),
+        )
+
+PALETTE_RGB = np.array(PALETTE, dtype=np.uint8)
+
+def to_rgb(frame: np.ndarray) -> np.ndarray:
+    """Expands a frame of palette indices to (height, width, 3) RGB."""
+    return PALETTE_RGB[frame]
+
+class renderer:
+    """Converts the 6912 byte display file and the border colour into a
+    frame of palette indices (0...7 normal, 8...15 bright). The frame can
+    be an array of the caller, e.g. one slice of a stack of frames."""
+
+    def __init__(self, frame: Optional[np.ndarray] = None):
+        # display file offsets of the 32 bitmap bytes and 32 attribute
+        # bytes that make up each of the 192 scanlines
+        ys = np.arange(192)
+        row = ((ys & 0xc0) << 5) | ((ys & 7) << 8) | ((ys & 0x38) << 2)
+        self.bitmap_index = row[:, None] + np.arange(32)[None, :]
+        self.attr_index = 0x1800 + (ys >> 3)[:, None] * 32 + np.arange(32)[None, :]
+
+        # ink/paper palette index per attribute byte, for both flash phases
+        attrs = np.arange(256)
+        bright = (attrs & 0x40) >> 3
+        ink = (attrs & 7) | bright
+        paper = ((attrs >> 3) & 7) | bright
+        flashing = (attrs & 0x80) != 0
+        self.ink = (ink.astype(np.uint8), np.where(flashing, paper, ink).astype(np.uint8))
+        self.paper = (paper.astype(np.uint8), np.where(flashing, ink, paper).astype(np.uint8))
+
+        # T-state at which the left border of each frame row starts
+        self.border_times = T_FIRST_PIXEL + (np.arange(FRAME_H) - BORDER_H) * T_LINE - BORDER_W // 2
+
+        if frame is None:
+            frame = np.zeros((FRAME_H, FRAME_W), dtype=np.uint8)
+
+        assert frame.shape == (FRAME_H, FRAME_W) and frame.dtype == np.uint8
+        self.frame = frame
+        self.display = self.frame[BORDER_H:BORDER_H + 192, BORDER_W:BORDER_W + 256]
+
+    def render_lines(self, vram, y0: int, y1: int, flash: int) -> None:
+        mem = np.frombuffer(vram, dtype=np.uint8)
+        bits = np.unpackbits(mem[self.bitmap_index[y0:y1]], axis=1).view(bool)
+        attr = np.repeat(mem[self.attr_index[y0:y1]], 8, axis=1)
+        np.copyto(self.display[y0:y1], np.where(bits, self.ink[flash][attr], self.paper[flash][attr]))
+
+    def render(self, vram, flash: int = 0) -> np.ndarray:
+        self.render_lines(vram, 0, 192, flash)
+        return self.frame
+
+    def render_border(self, border: int, log: List[Tuple[int, int]]) -> np.ndarray:
+        """Colours the border per frame row, 'border' is the colour at the
+        start of the frame and 'log' the (T-state, colour) changes."""
+        if log:
+            times = np.array([ t for t, c in log ])
+            colours = np.array([ border ] + [ c for t, c in log ], dtype=np.uint8)
+            rows = colours[np.searchsorted(times, self.border_times)]
+        else:
+            rows = np.full(FRAME_H, border, dtype=np.uint8)
+
+        f = self.frame
+        f[:BORDER_H] = rows[:BORDER_H, None]
+        f[BORDER_H + 192:] = rows[BORDER_H + 192:, None]
+        f[BORDER_H:BORDER_H + 192, :BORDER_W] = rows[BORDER_H:BORDER_H + 192, None]
+        f[BORDER_H:BORDER_H + 192, BORDER_W + 256:] = rows[BORDER_H:BORDER_H + 192, None]
+
+        return self.frame
+
+    def render_log(self, start, log: List[Tuple[int, int, int]], flash: int = 0) -> np.ndarray:
+        """Rebuilds the frame from the display file as it was at the start
+        of the frame plus the (T-state, offset, value) writes done while it
+        was being drawn. A write is visible from the first scanline that
+        starts after it, spans of lines in between are rendered in one go."""
+        vram = bytearray(start)
+        n = len(log)
+        i = 0
+        y = 0
+
+        while y < 192:
+            t_line = T_FIRST_PIXEL + y * T_LINE
+
+            while i < n and log[i][0] < t_line:
+                vram[log[i][1]] = log[i][2]
+                i += 1
+
+            if i == n:
+                self.render_lines(vram, y, 192, flash)
+                break
+
+            y_next = min(192, (log[i][0] - T_FIRST_PIXEL) // T_LINE + 1)
+            self.render_lines(vram, y, y_next, flash)
+            y = y_next
+
+        return self.frame
@@ -0,0 +1,96 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import zlib
+from collections import deque
+from typing import Optional
+
+class rewind:
+    """Bounded history of machine states (see state.py). Every interval'th
+    frame a state is kept: every keyframe_every'th one in full, the others
+    as the XOR against the preceding keyframe, all zlib compressed. States
+    are grouped per keyframe and the oldest group goes when the history
+    exceeds 'seconds'. While 'rewinding' is set nothing is kept, so that
+    pop() goes back further every time."""
+
+    def __init__(self, seconds: float, interval: int = 5, keyframe_every: int = 25, hz: float = 50):
+        assert interval >= 1 and keyframe_every >= 1
+
+        self.interval = interval
+        self.keyframe_every = keyframe_every
+        self.max_states = max(1, int(seconds * hz / interval))
+
+        # [ compressed keyframe, [ compressed deltas ] ]
+        self.groups: deque = deque()
+        self.keyframe: Optional[bytes] = None
+        self.n_states = 0
+        self.n_bytes = 0
+        self.frame_nr = 0
+        self.rewinding = False
+
+        # whether the newest state was kept at the end of the last frame
+        self.fresh = False
+
+    def xor(self, a: bytes, b: bytes) -> bytes:
+        return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+    def frame(self, get_state) -> None:
+        """To be invoked at the end of every frame, get_state() is only
+        invoked for the frames that are kept."""
+        if self.rewinding:
+            return
+
+        self.frame_nr += 1
+        self.fresh = self.frame_nr % self.interval == 0
+        if not self.fresh:
+            return
+
+        state = get_state()
+
+        if self.keyframe is None or len(self.groups[-1][1]) + 1 >= self.keyframe_every:
+            data = zlib.compress(state, 1)
+            self.groups.append([ data, [ ] ])
+            self.keyframe = state
+        else:
+            data = zlib.compress(self.xor(state, self.keyframe), 1)
+            self.groups[-1][1].append(data)
+
+        self.n_states += 1
+        self.n_bytes += len(data)
+
+        while self.n_states > self.max_states and len(self.groups) > 1:
+            key, deltas = self.groups.popleft()
+            self.n_states -= 1 + len(deltas)
+            self.n_bytes -= len(key) + sum(len(d) for d in deltas)
+
+    def pop(self) -> Optional[bytes]:
+        """Removes the most recent state from the history and returns it,
+        or None when the history is empty. A state that was kept at the end
+        of the last frame is skipped, it is hardly older than the current
+        state."""
+        if self.fresh:
+            self.fresh = False
+            self.drop()
+
+        return self.drop()
+
+    def drop(self) -> Optional[bytes]:
+        if not self.groups:
+            return None
+
+        key, deltas = self.groups[-1]
+
+        if deltas:
+            data = deltas.pop()
+            state = self.xor(zlib.decompress(data), self.keyframe)
+        else:
+            data = key
+            state = self.keyframe
+            self.groups.pop()
+            self.keyframe = zlib.decompress(self.groups[-1][0]) if self.groups else None
+
+        self.n_states -= 1
+        self.n_bytes -= len(data)
+        self.frame_nr = 0
+
+        return state
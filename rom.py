@@ -1,16 +1,41 @@
 # (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
 # released under MIT license
 
+import hashlib
+import os
 import sys
-from typing import List
+import threading
+from typing import Dict, Tuple
+
+# ROM images by path (with the size and modification time of the file) and
+# by SHA-256: all instances share one immutable copy of each image
+images: Dict[str, Tuple[int, int, bytes, str]] = {}
+images_by_hash: Dict[str, bytes] = {}
+images_lock = threading.Lock()
+
+def load_image(rom_file: str) -> Tuple[bytes, str]:
+    path = os.path.realpath(rom_file)
+    st = os.stat(path)
+
+    with images_lock:
+        entry = images.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2], entry[3]
 
-class rom:
-    def __init__(self, rom_file: str, debug, base_address: int):
         print('Loading ROM %s...' % rom_file, file=sys.stderr)
 
-        fh = open(rom_file, 'rb')
-        self.rom: List[int] = [ int(b) for b in fh.read() ]
-        fh.close()
+        with open(path, 'rb') as fh:
+            data = fh.read()
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        data = images_by_hash.setdefault(sha256, data)
+        images[path] = (st.st_size, st.st_mtime_ns, data, sha256)
+
+        return data, sha256
+
+class rom:
+    def __init__(self, rom_file: str, debug, base_address: int):
+        self.rom, self.sha256 = load_image(rom_file)
 
         self.base_address: int = base_address
 
@@ -2,28 +2,52 @@
 # released under MIT license
 
 import pygame
-from typing import List
+import threading
+from pygame._sdl2.video import Renderer, Texture, Window
+from renderer import FRAME_H, FRAME_W, PALETTE, renderer
+from ula import EV_MENU, EV_QUIT, EV_REWIND, EV_REWIND_END, EV_SAVE
 
 class screen_kb_zx_s:
-    def __init__(self, io, menu):
+    """pygame display backend: a single thread presents frames and pumps
+    the host events, independent of the emulation."""
+
+    def __init__(self, scale: int = 2, fullscreen: bool = False):
         pygame.init()
-        pygame.fastevent.init()
         pygame.display.init()
-        pygame.display.set_caption('pyzxspectrum')
-
-        self.ram = [ 0 for i in range(16384) ]
-
-        self.menu = menu
 
-        w = 256
-        h = 192
-        self.screen = pygame.display.set_mode(size=(w, h), flags=pygame.DOUBLEBUF)
-        self.surface = pygame.Surface((w, h))
-        self.arr = pygame.surfarray.array2d(self.screen)
-
-        self.refresh = False
-        self.keys_pressed: dict = {}
-        self.row = None
+        self.ring = None
+        self.events = None
+        self.renderer = renderer()
+        self.thread = None
+        self.running = False
+
+        self.size = (FRAME_W * scale, FRAME_H * scale)
+        self.fullscreen = fullscreen
+        self.window = None
+
+        # frames are written as 8 bit palette indices, SDL converts them
+        # (into 'pixels') and scales; one streaming texture is updated per
+        # frame
+        self.surface = pygame.Surface((FRAME_W, FRAME_H), depth=8)
+        self.surface.set_palette(PALETTE)
+        self.pixels = pygame.Surface((FRAME_W, FRAME_H), depth=32)
+        self.sdl_renderer = None
+        self.texture = None
+
+        # host key to (half-row << 4) | (bit << 1) of the keyboard matrix
+        rows = ((pygame.K_LSHIFT, pygame.K_z     , pygame.K_x, pygame.K_c, pygame.K_v),
+                (pygame.K_a     , pygame.K_s     , pygame.K_d, pygame.K_f, pygame.K_g),
+                (pygame.K_q     , pygame.K_w     , pygame.K_e, pygame.K_r, pygame.K_t),
+                (pygame.K_1     , pygame.K_2     , pygame.K_3, pygame.K_4, pygame.K_5),
+                (pygame.K_0     , pygame.K_9     , pygame.K_8, pygame.K_7, pygame.K_6),
+                (pygame.K_p     , pygame.K_o     , pygame.K_i, pygame.K_u, pygame.K_y),
+                (pygame.K_RETURN, pygame.K_l     , pygame.K_k, pygame.K_j, pygame.K_h),
+                (pygame.K_SPACE , pygame.K_RSHIFT, pygame.K_m, pygame.K_n, pygame.K_b))
+
+        self.keymap: dict = {}
+        for row in range(8):
+            for bit in range(5):
+                self.keymap[rows[row][bit]] = (row << 4) | (bit << 1)
 
         print(pygame.display.Info())
 
@@ -31,141 +55,83 @@ class screen_kb_zx_s:
         return 'screen/keyboard'
 
     def poll_kb(self) -> None:
-        events = pygame.fastevent.get()
-
-        for event in events:
+        for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                self.stop_flag = True
+                self.events.append(EV_QUIT)
                 break
 
             if event.type == pygame.KEYDOWN:
-                #if event.key == pygame.K_RETURN:
-                #    print('MARKER', file=sys.stderr, flush=True)
+                # F8 rewinds for as long as it is held down
+                if event.key == pygame.K_F8:
+                    self.events.append(EV_REWIND)
 
-                self.keys_pressed[event.key] = True
+                elif event.key in self.keymap:
+                    self.events.append(self.keymap[event.key] | 1)
 
             elif event.type == pygame.KEYUP:
-                if pygame.K_F10 in self.keys_pressed and self.keys_pressed[pygame.K_F10] == True and self.menu != None:
-                    self.menu()
-
-                self.keys_pressed[event.key] = False
-
-            #else:
-            #    print(event)
-
-    def interrupt(self):
-        self.poll_kb()
-
-        if self.refresh == False:
-            return
-
-        self.refresh = False
-
-        palette = (
-                (
-                    (0x00, 0x00, 0x00),
-                    (0x01, 0x00, 0xce),
-                    (0xcf, 0x01, 0x00),
-                    (0xcf, 0x01, 0xce),
-                    (0x00, 0xcf, 0x15),
-                    (0x00, 0xcf, 0xcf),
-                    (0xcf, 0xcf, 0x15),
-                    (0xcf, 0xcf, 0xcf),
-                    ),
-                (
-                    (0x00, 0x00, 0x00),
-                    (0x02, 0x00, 0xfd),
-                    (0xff, 0x02, 0x01),
-                    (0xff, 0x02, 0xfd),
-                    (0x00, 0xff, 0x1c),
-                    (0x02, 0xff, 0xff),
-                    (0xff, 0xff, 0x1d),
-                    (0xff, 0xff, 0xff),
-                    )
-                )
-
-
-        par = pygame.PixelArray(self.surface)
-        for a in range(0x1800):
-            # 0, 1, 0, y7, y6, y2, y1, y0, y5, y4, y3, x7, x6, x5, x4, x3
-            x = (a & 31) << 3
-            yl = (a >> 8) & 7
-            ym = (a >> 5) & 7
-            yh = (a >> 11) & 3
-            y = yl | (ym << 3) | (yh << 6)
-            assert y < 192
-
-            pattern = self.ram[a]
-
-            x_idx = x // 8
-            y_idx = y // 8
-            colour_idx = y_idx * 32 + x_idx
-            assert colour_idx >= 0 and colour_idx < 768
-            colour = self.ram[0x1800 + colour_idx]
-            brightness = 1 if colour & 64 else 0
-            colour_fg = self.rgb_to_i(palette[brightness][colour & 7])
-            colour_bg = self.rgb_to_i(palette[brightness][(colour >> 3) & 7])
-
-            for x_it in range(x, x + 8):
-                self.arr[x_it, y] = colour_fg if pattern & 128 else colour_bg
-                pattern <<= 1
-
-        pygame.surfarray.blit_array(self.screen, self.arr)
-        pygame.display.flip()
-        pygame.display.update()
-
-    def IE0(self) -> bool:
-        return True
-
-    def start(self):
-        pass
-
-    def rgb_to_i(self, rgb: List[int]) -> int:
-        return (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
-
-    def write_mem(self, a: int, v: int) -> None:
-        assert a >= 0x4000 and a < 0x5b00
-        self.ram[a - 0x4000] = v
-        self.refresh = True
-
-    def write_io(self, a: int, v: int) -> None:
-        pass
-
-    def read_mem(self, a: int) -> int:
-        assert a >= 0x4000 and a < 0x5b00
-        return self.ram[a - 0x4000]
-
-    def test_keys(self, which):
-        byte = 0
-        bit_nr = 0
-        for key in which:
-            if key in self.keys_pressed and self.keys_pressed[key] == True:
-                byte |= 1 << bit_nr
-            bit_nr += 1
-        return byte ^ 0xff
-
-    def read_io(self, a: int) -> int:
-        row = [ 0 ] * 8
-        row[0] = self.test_keys((pygame.K_LSHIFT, pygame.K_z     , pygame.K_x, pygame.K_c, pygame.K_v))
-        row[1] = self.test_keys((pygame.K_a     , pygame.K_s     , pygame.K_d, pygame.K_f, pygame.K_g))
-        row[2] = self.test_keys((pygame.K_q     , pygame.K_w     , pygame.K_e, pygame.K_r, pygame.K_t))
-        row[3] = self.test_keys((pygame.K_1     , pygame.K_2     , pygame.K_3, pygame.K_4, pygame.K_5))
-        row[4] = self.test_keys((pygame.K_0     , pygame.K_9     , pygame.K_8, pygame.K_7, pygame.K_6))
-        row[5] = self.test_keys((pygame.K_p     , pygame.K_o     , pygame.K_i, pygame.K_u, pygame.K_y))
-        row[6] = self.test_keys((pygame.K_RETURN, pygame.K_l     , pygame.K_k, pygame.K_j, pygame.K_h))
-        row[7] = self.test_keys((pygame.K_SPACE , pygame.K_RSHIFT, pygame.K_m, pygame.K_n, pygame.K_b))
-
-        rows = (a >> 8) ^ 0xff
-
-        v = 255
-        for bit in range(8):
-            if rows & (1 << bit):
-                v &= row[bit]
-
-        return v
+                if event.key == pygame.K_F10:
+                    self.events.append(EV_MENU)
+
+                elif event.key == pygame.K_F9:
+                    self.events.append(EV_SAVE)
+
+                elif event.key == pygame.K_F8:
+                    self.events.append(EV_REWIND_END)
+
+                elif event.key in self.keymap:
+                    self.events.append(self.keymap[event.key])
+
+    def render_thread(self):
+        # SDL wants the window, its renderer and the event pump all in the
+        # thread that created the window
+        self.window = Window('pyzxspectrum', size=self.size, fullscreen_desktop=self.fullscreen)
+        self.sdl_renderer = Renderer(self.window, vsync=True)
+        self.texture = Texture(self.sdl_renderer, (FRAME_W, FRAME_H), streaming=True)
+
+        while self.running:
+            # wakes up at least 100 times per second to poll the keyboard,
+            # also when emulation runs faster or slower than real time
+            slot = self.ring.get(0.01)
+
+            self.poll_kb()
+
+            if slot is None:
+                continue
+
+            self.renderer.render_log(slot.vram, slot.log, slot.flash)
+            frame = self.renderer.render_border(slot.border, slot.border_log)
+            self.ring.release()
+
+            pygame.surfarray.blit_array(self.surface, frame.T)
+            self.present()
+
+    def present(self):
+        self.pixels.blit(self.surface, (0, 0))
+        self.texture.update(self.pixels)
+
+        # largest integer scale that fits the window
+        w, h = self.window.size
+        scale = max(1, min(w // FRAME_W, h // FRAME_H))
+        x = (w - FRAME_W * scale) // 2
+        y = (h - FRAME_H * scale) // 2
+
+        self.sdl_renderer.clear()
+        self.sdl_renderer.blit(self.texture, pygame.Rect(x, y, FRAME_W * scale, FRAME_H * scale))
+        self.sdl_renderer.present()
+
+    def start(self, ring, events):
+        self.ring = ring
+        self.events = events
+        self.running = True
+        self.thread = threading.Thread(target=self.render_thread, name='render', daemon=True)
+        self.thread.start()
 
     def debug(self, str_):
         print(str_)
 
     def stop(self):
-        pass
+        self.running = False
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
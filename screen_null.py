@@ -0,0 +1,15 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+class screen_null:
+    """Display backend for running without a display (batch jobs, CI):
+    frames are not presented and no key is ever pressed."""
+
+    def get_name(self):
+        return 'null'
+
+    def start(self, ring, events):
+        pass
+
+    def stop(self):
+        pass
@@ -0,0 +1,252 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import numpy as np
+import os
+import select
+import sys
+import termios
+import threading
+import time
+import tty
+from renderer import renderer
+from ula import EV_MENU, EV_QUIT, EV_REWIND, EV_REWIND_END, EV_SAVE
+
+# braille dot (bit) of the pixel at (row, column) within a 2x4 cell
+DOTS = np.array([ [ 0x01, 0x08 ], [ 0x02, 0x10 ], [ 0x04, 0x20 ], [ 0x40, 0x80 ] ], dtype=np.uint16)
+
+# Spectrum colour (bit 0 blue, 1 red, 2 green) to ANSI colour (bit 0 red,
+# 1 green, 2 blue)
+ANSI = [ ((c >> 1) & 1) | (((c >> 2) & 1) << 1) | ((c & 1) << 2) for c in range(8) ]
+
+# around the 128x48 characters of the display area
+BORDER_W = 2
+BORDER_H = 1
+
+# keyboard (half-row, bit) per host character; CAPS SHIFT is (0, 0) and
+# SYMBOL SHIFT (7, 1)
+MATRIX = ( 'Xzxcv', 'asdfg', 'qwert', '12345', '09876', 'poiuy', 'Xlkjh', ' Xmnb' )
+SYMBOLS = { '!': '1', '@': '2', '#': '3', '$': '4', '%': '5', '&': '6', "'": '7', '(': '8', ')': '9',
+            '_': '0', '<': 'r', '>': 't', ';': 'o', '"': 'p', '=': 'l', '+': 'k', '-': 'j', '^': 'h',
+            ':': 'z', '?': 'c', '/': 'v', '*': 'b', ',': 'n', '.': 'm' }
+CAPS = (0 << 4) | (0 << 1)
+SYMBOL = (7 << 4) | (1 << 1)
+ENTER = (6 << 4) | (0 << 1)
+
+# the terminal only reports key presses: keys are released after this long
+HOLD = 0.08
+
+class screen_terminal:
+    """Terminal display backend: the display area is drawn with braille
+    characters, one attribute cell is 4x2 of them so each has exactly one
+    ink (foreground) and paper (background) colour. Only characters that
+    changed since the previous frame are written. Keys are read from stdin
+    in cbreak mode, Ctrl-C ends the emulation."""
+
+    def __init__(self):
+        self.ring = None
+        self.events = None
+        self.thread = None
+        self.running = False
+
+        self.renderer = renderer()
+
+        # character, ink and paper per braille cell as last written
+        self.chars = None
+        self.inks = None
+        self.papers = None
+        self.border = None
+
+        self.keymap: dict = {}
+        for row in range(8):
+            for bit, c in enumerate(MATRIX[row]):
+                if c != 'X':
+                    code = (row << 4) | (bit << 1)
+                    self.keymap[c] = (code,)
+                    if c.isalpha():
+                        self.keymap[c.upper()] = (CAPS, code)
+
+        for c, key in SYMBOLS.items():
+            self.keymap[c] = (SYMBOL, self.keymap[key][0])
+
+        self.keymap['\r'] = self.keymap['\n'] = (ENTER,)
+        self.keymap['\x7f'] = self.keymap['\b'] = (CAPS, self.keymap['0'][0])  # DELETE
+
+        # escape sequences: cursor keys and F8, F9, F10
+        self.sequences = { '\x1b[A': (CAPS, self.keymap['7'][0]), '\x1b[B': (CAPS, self.keymap['6'][0]),
+                           '\x1b[D': (CAPS, self.keymap['5'][0]), '\x1b[C': (CAPS, self.keymap['8'][0]),
+                           '\x1b[19~': EV_REWIND, '\x1b[20~': EV_SAVE, '\x1b[21~': EV_MENU }
+
+        # (release time, key codes) of the keys that are down
+        self.pressed: list = []
+        self.tty_mode = None
+
+    def get_name(self):
+        return 'terminal'
+
+    def press(self, codes: tuple) -> None:
+        for code in codes:
+            self.events.append(code | 1)
+
+        self.pressed.append((time.monotonic() + HOLD, codes))
+
+    def rewind(self) -> None:
+        # like a key: F8 rewinds until it is released (auto repeat keeps
+        # it going)
+        self.events.append(EV_REWIND)
+        self.pressed.append((time.monotonic() + HOLD, (EV_REWIND_END,)))
+
+    def poll_kb(self) -> None:
+        now = time.monotonic()
+        while self.pressed and self.pressed[0][0] <= now:
+            for code in self.pressed.pop(0)[1]:
+                self.events.append(code)
+
+        if not select.select([ sys.stdin ], [], [], 0)[0]:
+            return
+
+        data = os.read(sys.stdin.fileno(), 64).decode('utf-8', errors='ignore')
+        i = 0
+
+        while i < len(data):
+            c = data[i]
+
+            if c == '\x03':  # ctrl+c
+                self.events.append(EV_QUIT)
+                return
+
+            if c == '\x1b':
+                for sequence, what in self.sequences.items():
+                    if data.startswith(sequence, i):
+                        if isinstance(what, tuple):
+                            self.press(what)
+                        elif what == EV_REWIND:
+                            self.rewind()
+                        else:
+                            self.events.append(what)
+
+                        i += len(sequence)
+                        break
+                else:
+                    i += 1
+
+                continue
+
+            if c in self.keymap:
+                self.press(self.keymap[c])
+
+            i += 1
+
+    def draw(self, vram, flash: int, border: int) -> str:
+        mem = np.frombuffer(vram, dtype=np.uint8)
+        bits = np.unpackbits(mem[self.renderer.bitmap_index], axis=1)
+
+        attrs = mem[0x1800:0x1b00].reshape(24, 32)
+        if flash:
+            # flashing cells show ink and paper swapped
+            bits ^= np.repeat(np.repeat(attrs >> 7, 8, axis=0), 8, axis=1)
+
+        chars = (bits.reshape(48, 4, 128, 2) * DOTS[None, :, None, :]).sum(axis=(1, 3)) + 0x2800
+
+        # attributes per braille cell: bright, then ink and paper
+        cell_attrs = np.repeat(np.repeat(attrs, 2, axis=0), 4, axis=1)
+        bright = (cell_attrs >> 6) & 1
+        inks = cell_attrs & 7 | (bright << 3)
+        papers = (cell_attrs >> 3) & 7 | (bright << 3)
+
+        out = []
+
+        if border != self.border:
+            self.border = border
+
+            colour = f'\x1b[{40 + ANSI[border]}m'
+            width = 128 + 2 * BORDER_W
+            for y in range(48 + 2 * BORDER_H):
+                if y < BORDER_H or y >= 48 + BORDER_H:
+                    out.append(f'\x1b[{y + 1};1H{colour}' + ' ' * width)
+                else:
+                    out.append(f'\x1b[{y + 1};1H{colour}' + ' ' * BORDER_W + f'\x1b[{y + 1};{BORDER_W + 128 + 1}H' + ' ' * BORDER_W)
+
+        if self.chars is None:
+            changed = np.ones((48, 128), dtype=bool)
+        else:
+            changed = (chars != self.chars) | (inks != self.inks) | (papers != self.papers)
+
+        last = None
+        previous = None
+        for y, x in zip(*np.nonzero(changed)):
+            if previous != (y, x - 1):
+                out.append(f'\x1b[{y + BORDER_H + 1};{x + BORDER_W + 1}H')
+
+            colours = (inks[y, x], papers[y, x])
+            if colours != last:
+                ink, paper = colours
+                out.append(f'\x1b[{(90 if ink & 8 else 30) + ANSI[ink & 7]};{(100 if paper & 8 else 40) + ANSI[paper & 7]}m')
+                last = colours
+
+            out.append(chr(chars[y, x]))
+            previous = (y, x)
+
+        self.chars = chars
+        self.inks = inks
+        self.papers = papers
+
+        return ''.join(out)
+
+    def render_thread(self):
+        while self.running:
+            slot = self.ring.get(0.01)
+
+            self.poll_kb()
+
+            if slot is None:
+                continue
+
+            # a terminal cannot show mid-frame changes, draw how the frame ended
+            vram = bytearray(slot.vram)
+            for t, offset, value in slot.log:
+                vram[offset] = value
+
+            border = slot.border_log[-1][1] if slot.border_log else slot.border
+            flash = slot.flash
+            self.ring.release()
+
+            out = self.draw(vram, flash, border)
+            if out:
+                sys.stdout.write(out + '\x1b[0m')
+                sys.stdout.flush()
+
+    def start(self, ring, events):
+        self.ring = ring
+        self.events = events
+
+        if sys.stdin.isatty():
+            self.tty_mode = termios.tcgetattr(sys.stdin)
+            tty.setcbreak(sys.stdin.fileno())
+
+            # Ctrl-C as a character (see poll_kb), not as SIGINT
+            mode = termios.tcgetattr(sys.stdin)
+            mode[3] &= ~termios.ISIG
+            termios.tcsetattr(sys.stdin, termios.TCSANOW, mode)
+
+        # alternate screen, cursor hidden
+        sys.stdout.write('\x1b[?1049h\x1b[?25l\x1b[2J')
+        sys.stdout.flush()
+
+        self.running = True
+        self.thread = threading.Thread(target=self.render_thread, name='render', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+        sys.stdout.write('\x1b[0m\x1b[?25h\x1b[?1049l')
+        sys.stdout.flush()
+
+        if self.tty_mode:
+            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self.tty_mode)
+            self.tty_mode = None
@@ -0,0 +1,148 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import mmap
+import numpy as np
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from renderer import FRAME_H, FRAME_W, renderer
+from typing import Optional
+
+MAGIC = b'PZXF'
+VERSION = 1
+
+# magic, version, width, height, sequence number (odd while the frame is
+# being written), frame number, border, flash phase
+HEADER = struct.Struct('<4sHHH6xQQBB')
+SEQUENCE_OFFSET = 16
+
+# the frame (palette indices, see renderer.py) and the 64kB memory map
+# follow the header
+FRAME_OFFSET = 64
+MEMORY_OFFSET = FRAME_OFFSET + FRAME_H * FRAME_W
+SIZE = MEMORY_OFFSET + 0x10000
+
+SEQUENCE = struct.Struct('<Q')
+
+def attach(name: Optional[str], path: Optional[str], create: bool):
+    """Returns the shared memory block or mmap'd file and its buffer."""
+    if path:
+        with open(path, 'w+b' if create else 'r+b') as fh:
+            if create:
+                fh.truncate(SIZE)
+
+            m = mmap.mmap(fh.fileno(), SIZE)
+
+        return m, memoryview(m)
+
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=create, size=SIZE if create else 0, track=create)
+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name, create=create, size=SIZE if create else 0)
+
+        # before Python 3.13 readers track the block as well, and remove it
+        # when they exit
+        if not create:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+    return shm, shm.buf
+
+class shared_frame:
+    """Publishes the rendered frame and the memory map of a machine after
+    every frame in shared memory (by name) or an mmap'd file (by path),
+    for other processes to read without IPC. A sequence number makes this
+    a seqlock: it is odd while the writer is busy, readers retry when it
+    was odd or changed while they copied (see shared_frame_reader)."""
+
+    def __init__(self, name: Optional[str] = None, path: Optional[str] = None, rom: Optional[bytes] = None):
+        self.store, self.buf = attach(name, path, True)
+        self.name = self.store.name if not path else path
+        self.path = path
+
+        self.sequence = 0
+        self.generation = None
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, FRAME_W, FRAME_H, 0, 0, 7, 0)
+
+        self.frame = np.ndarray((FRAME_H, FRAME_W), dtype=np.uint8, buffer=self.buf, offset=FRAME_OFFSET)
+        self.memory = self.buf[MEMORY_OFFSET:MEMORY_OFFSET + 0x10000]
+        self.renderer = renderer(self.frame)
+
+        # the ROM image in the memory map, only written when it changes
+        self.rom = None
+        if rom is not None:
+            self.set_rom(rom)
+
+    def set_rom(self, rom: bytes) -> None:
+        self.memory[0:0x4000] = rom[0:0x4000]
+        self.rom = rom
+
+    def publish(self, m) -> None:
+        """Writes the current state of machine m."""
+        self.sequence += 1
+        SEQUENCE.pack_into(self.buf, SEQUENCE_OFFSET, self.sequence)
+
+        dk = m.dk
+        if dk.generation != self.generation:
+            self.renderer.render(dk.ram, dk.flash)
+            self.renderer.render_border(dk.border, [])
+            self.generation = dk.generation
+
+        if m.rom.rom is not self.rom:
+            self.set_rom(m.rom.rom)
+
+        self.memory[0x4000:0x5b00] = dk.ram
+        self.memory[0x5b00:] = m.ram_.dump()
+
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, FRAME_W, FRAME_H, self.sequence + 1, dk.frame_nr, dk.border, dk.flash)
+        self.sequence += 1
+
+    def close(self) -> None:
+        del self.frame, self.memory, self.renderer
+        self.buf.release()
+        self.store.close()
+
+        if not self.path:
+            self.store.unlink()
+
+class shared_frame_reader:
+    """Reads what a shared_frame in another process publishes."""
+
+    def __init__(self, name: Optional[str] = None, path: Optional[str] = None):
+        self.store, self.buf = attach(name, path, False)
+
+        magic, version = HEADER.unpack_from(self.buf)[0:2]
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a shared frame')
+
+        # views on the live data, these can change while being looked at
+        self.frame = np.ndarray((FRAME_H, FRAME_W), dtype=np.uint8, buffer=self.buf, offset=FRAME_OFFSET)
+        self.memory = self.buf[MEMORY_OFFSET:MEMORY_OFFSET + 0x10000]
+
+    def frame_nr(self) -> int:
+        return HEADER.unpack_from(self.buf)[5]
+
+    def read(self, frame: np.ndarray, memory: Optional[bytearray] = None) -> tuple:
+        """Copies a consistent frame (and memory map) into the arrays given,
+        returns (frame number, border, flash phase)."""
+        while True:
+            before = SEQUENCE.unpack_from(self.buf, SEQUENCE_OFFSET)[0]
+
+            if before & 1:
+                time.sleep(0)
+                continue
+
+            frame_nr, border, flash = HEADER.unpack_from(self.buf)[5:8]
+            np.copyto(frame, self.frame)
+
+            if memory is not None:
+                memory[:] = self.memory
+
+            if SEQUENCE.unpack_from(self.buf, SEQUENCE_OFFSET)[0] == before:
+                return frame_nr, border, flash
+
+    def close(self) -> None:
+        del self.frame, self.memory
+        self.buf.release()
+        self.store.close()
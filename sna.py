@@ -0,0 +1,61 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import struct
+from snapshot import snapshot
+
+# I, HL', DE', BC', AF', HL, DE, BC, IY, IX, IFF2, R, AF, SP, IM, border
+HEADER = struct.Struct('<B9HBBHHBB')
+
+SIZE = HEADER.size + 0xc000
+
+def peek(ram, a: int) -> int:
+    return ram[a - 0x4000] if a >= 0x4000 else 0
+
+def poke(ram, a: int, v: int) -> None:
+    if a >= 0x4000:
+        ram[a - 0x4000] = v
+
+def read_sna(data: bytes) -> snapshot:
+    assert len(data) == SIZE, 'not a 48k .SNA file'
+
+    (i, hl_, de_, bc_, af_, hl, de, bc, iy, ix, iff2, r, af, sp, im, border) = HEADER.unpack_from(data)
+
+    ram = data[HEADER.size:]
+
+    # PC is on the stack, as if an interrupt just happened; pop it (RETN)
+    pc = peek(ram, sp) | (peek(ram, (sp + 1) & 0xffff) << 8)
+    iff = (iff2 & 4) == 4
+
+    regs = { 'i': i, 'h_': hl_ >> 8, 'l_': hl_ & 255, 'd_': de_ >> 8, 'e_': de_ & 255,
+             'b_': bc_ >> 8, 'c_': bc_ & 255, 'a_': af_ >> 8, 'f_': af_ & 255,
+             'h': hl >> 8, 'l': hl & 255, 'd': de >> 8, 'e': de & 255, 'b': bc >> 8, 'c': bc & 255,
+             'iy': iy, 'ix': ix, 'r': r, 'a': af >> 8, 'f': af & 255, 'sp': (sp + 2) & 0xffff,
+             'pc': pc, 'im': im & 3, 'iff1': iff, 'iff2': iff, 'interrupts': iff }
+
+    return snapshot(regs, ram, border & 7)
+
+def write_sna(s: snapshot) -> bytes:
+    r = s.regs
+
+    # PC is pushed onto the stack of the copy that is written
+    ram = bytearray(s.ram)
+    sp = (r['sp'] - 2) & 0xffff
+    poke(ram, sp, r['pc'] & 255)
+    poke(ram, (sp + 1) & 0xffff, r['pc'] >> 8)
+
+    header = HEADER.pack(r['i'], (r['h_'] << 8) | r['l_'], (r['d_'] << 8) | r['e_'],
+                         (r['b_'] << 8) | r['c_'], (r['a_'] << 8) | r['f_'],
+                         (r['h'] << 8) | r['l'], (r['d'] << 8) | r['e'], (r['b'] << 8) | r['c'],
+                         r['iy'], r['ix'], 4 if r['interrupts'] else 0, r['r'],
+                         (r['a'] << 8) | r['f'], sp, r['im'], s.border)
+
+    return header + ram
+
+def load_sna(file: str) -> snapshot:
+    with open(file, 'rb') as fh:
+        return read_sna(fh.read())
+
+def save_sna(file: str, s: snapshot) -> None:
+    with open(file, 'wb') as fh:
+        fh.write(write_sna(s))
@@ -0,0 +1,45 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+# CPU attributes that make up the register set of a snapshot
+REGISTERS = ( 'a', 'f', 'b', 'c', 'd', 'e', 'h', 'l', 'a_', 'f_', 'b_', 'c_', 'd_', 'e_', 'h_', 'l_',
+              'ix', 'iy', 'sp', 'pc', 'i', 'r', 'im', 'iff1', 'iff2', 'interrupts' )
+
+class snapshot:
+    """Registers, 48kB of RAM (0x4000...0xffff) and border colour, as read
+    from or written to a snapshot file."""
+
+    def __init__(self, regs: dict, ram: bytes, border: int = 7):
+        assert len(ram) == 0xc000
+        self.regs = regs
+        self.ram = ram
+        self.border = border
+
+        # machine the snapshot was taken from, only 48k is emulated
+        self.model = '48k'
+
+    def apply(self, cpu, dk, ram_) -> None:
+        """Replaces the state of the machine. What the file does not hold
+        is reset, as at the start of a frame: a snapshot always continues
+        the same way, whatever ran before."""
+        for name, value in self.regs.items():
+            setattr(cpu, name, value)
+
+        cpu.memptr = 0
+        cpu.int = False
+        cpu.interrupt_cycles = 0
+
+        dk.load(self.ram[0:0x1b00])
+        dk.border = self.border
+        dk.border_start = self.border
+        dk.border_log = []
+        dk.ear = 0
+        dk.ear_start = 0
+        dk.ear_log = []
+        dk.flash = 0
+        dk.frame_nr = 0
+        ram_.load(self.ram[0x1b00:])
+
+def capture(cpu, dk, ram_) -> snapshot:
+    regs = { name: getattr(cpu, name) for name in REGISTERS }
+    return snapshot(regs, bytes(dk.ram) + ram_.dump(), dk.border)
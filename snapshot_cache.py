@@ -0,0 +1,31 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import os
+from sna import load_sna
+from snapshot import snapshot
+from typing import Dict, Tuple
+from z80_snapshot import load_z80
+
+# parsed snapshots by path, with the size and modification time of the file
+# they were parsed from; snapshots are never modified so can be shared
+cache: Dict[str, Tuple[int, int, snapshot]] = {}
+
+def load_snapshot(file: str) -> snapshot:
+    """Returns the parsed .SNA or .Z80 file, only reading it when it is not
+    cached yet or when it has changed on disk."""
+    path = os.path.realpath(file)
+    st = os.stat(path)
+
+    entry = cache.get(path)
+    if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+        return entry[2]
+
+    if path.lower().endswith('.z80'):
+        s = load_z80(path)
+    else:
+        s = load_sna(path)
+
+    cache[path] = (st.st_size, st.st_mtime_ns, s)
+
+    return s
@@ -0,0 +1,67 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import struct
+
+MAGIC = b'PZXS'
+VERSION = 2
+
+# 8 bit registers in the order they are stored
+REGISTERS_8 = ( 'a', 'f', 'b', 'c', 'd', 'e', 'h', 'l', 'a_', 'f_', 'b_', 'c_', 'd_', 'e_', 'h_', 'l_', 'i', 'r', 'im' )
+
+# magic, version, 8 bit registers, IX, IY, SP, PC, MEMPTR, IFF1, IFF2,
+# interrupts enabled, interrupt pending, T-states into the frame,
+# border, EAR bit, flash phase, frame number, keyboard matrix
+HEADER = struct.Struct('<4sH19B5H4BiBBBI8s')
+
+SIZE = HEADER.size + 0x1b00 + 0xa500
+
+def save_state(cpu, dk, ram_) -> bytes:
+    """Returns the complete machine state as one blob, see load_state()."""
+    header = HEADER.pack(MAGIC, VERSION, *[ getattr(cpu, name) for name in REGISTERS_8 ],
+                         cpu.ix, cpu.iy, cpu.sp, cpu.pc, cpu.memptr,
+                         cpu.iff1, cpu.iff2, cpu.interrupts, cpu.int, cpu.interrupt_cycles,
+                         dk.border, dk.ear, dk.flash, dk.frame_nr, bytes(dk.keys))
+
+    return b''.join((header, dk.ram, ram_.dump()))
+
+def load_state(cpu, dk, ram_, blob: bytes) -> None:
+    fields = HEADER.unpack_from(blob)
+
+    if fields[0] != MAGIC:
+        raise ValueError('not a machine state')
+
+    if fields[1] != VERSION:
+        raise ValueError(f'machine state version {fields[1]} is not supported')
+
+    if len(blob) != SIZE:
+        raise ValueError('machine state has the wrong size')
+
+    n = len(REGISTERS_8)
+    for name, value in zip(REGISTERS_8, fields[2:2 + n]):
+        setattr(cpu, name, value)
+
+    (cpu.ix, cpu.iy, cpu.sp, cpu.pc, cpu.memptr, cpu.iff1, cpu.iff2, interrupts, int_, cpu.interrupt_cycles,
+     dk.border, dk.ear, dk.flash, dk.frame_nr, keys) = fields[2 + n:]
+
+    cpu.interrupts = interrupts != 0
+    cpu.int = int_ != 0
+
+    mem = memoryview(blob)
+    dk.load(mem[HEADER.size:HEADER.size + 0x1b00])
+    dk.border_start = dk.border
+    dk.border_log = []
+    dk.ear_start = dk.ear
+    dk.ear_log = []
+    dk.keys[:] = keys
+    dk.kb_cache = [ None ] * 256
+
+    ram_.load(mem[HEADER.size + 0x1b00:])
+
+def save_state_file(file: str, cpu, dk, ram_) -> None:
+    with open(file, 'wb') as fh:
+        fh.write(save_state(cpu, dk, ram_))
+
+def load_state_file(file: str, cpu, dk, ram_) -> None:
+    with open(file, 'rb') as fh:
+        load_state(cpu, dk, ram_, fh.read())
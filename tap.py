@@ -0,0 +1,84 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+from typing import List, Optional
+
+# LD-BYTES of the 48k ROM: A is the expected flag byte, IX the destination,
+# DE the length and the carry flag is set for LOAD, reset for VERIFY
+LD_BYTES: int = 0x0556
+
+# keyboard (half-row, bit) sequence typing LOAD "" ENTER in K-mode, every
+# entry is one key press; a tuple of keys is pressed together
+LOAD_KEYS = ( ((6, 3),),            # J: LOAD
+              ((7, 1), (5, 0)),     # symbol shift + P: "
+              ((7, 1), (5, 0)),
+              ((6, 0),) )           # ENTER
+
+def read_tap(data: bytes) -> List[bytes]:
+    """Returns the blocks (flag byte, data, checksum) of a .TAP image."""
+    blocks = []
+    pos = 0
+
+    while pos + 2 <= len(data):
+        length = data[pos] | (data[pos + 1] << 8)
+        pos += 2
+
+        assert pos + length <= len(data), 'truncated .TAP file'
+        blocks.append(data[pos:pos + length])
+        pos += length
+
+    return blocks
+
+def load_tap(file: str) -> List[bytes]:
+    with open(file, 'rb') as fh:
+        return read_tap(fh.read())
+
+class tape:
+    """Blocks of a .TAP image, handed to the ROM through a trap on
+    LD-BYTES instead of as pulses on the EAR input."""
+
+    def __init__(self, blocks: List[bytes]):
+        self.blocks = blocks
+        self.position = 0
+
+    def next_block(self) -> Optional[bytes]:
+        if self.position >= len(self.blocks):
+            return None
+
+        block = self.blocks[self.position]
+        self.position += 1
+
+        return block
+
+    def ld_bytes(self, m) -> None:
+        """Trap for LD-BYTES on machine m: does what that routine does with
+        the next block and returns to the caller, carry set on success."""
+        cpu = m.cpu
+        block = self.next_block()
+        ok = False
+
+        if block and len(block) >= 2 and block[0] == cpu.a:
+            data = block[1:-1]
+            n = min(cpu.m16(cpu.d, cpu.e), len(data))
+
+            checksum = 0
+            for v in block:
+                checksum ^= v
+
+            if cpu.get_flag_c():  # LOAD
+                for i in range(n):
+                    m.write_mem((cpu.ix + i) & 0xffff, data[i])
+
+                ok = True
+
+            else:  # VERIFY
+                ok = all(m.read_mem((cpu.ix + i) & 0xffff) == data[i] for i in range(n))
+
+            de = cpu.m16(cpu.d, cpu.e) - n
+            cpu.d, cpu.e = de >> 8, de & 255
+            cpu.ix = (cpu.ix + n) & 0xffff
+
+            ok = ok and de == 0 and checksum == 0
+
+        cpu.set_flag_c(ok)
+        cpu.pc = cpu.pop()
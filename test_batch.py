@@ -0,0 +1,53 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+# batch results must not depend on the boot cache, run with:
+# python3 -m pytest -q
+
+import batch
+import os
+from machine import booted_machine
+
+ROM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zxspectrum', '48.rom')
+
+def flash_image(path: str) -> str:
+    """A .SNA of the booted machine with FLASH set in every attribute."""
+    m = booted_machine(ROM)
+
+    for a in range(0x5800, 0x5b00):
+        m.write_mem(a, 0x80 | (a & 0x3f))
+
+    file = os.path.join(path, 'flash.sna')
+    m.save(file)
+
+    return file
+
+def run(base, file: str) -> dict:
+    batch.base = base
+    result = batch.run_job(file, 20, None, None)
+    assert result['stopped'] == 'frames', result
+
+    return result
+
+def test_cold_and_cached_boot(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+
+    cold = booted_machine(ROM)
+    cached = booted_machine(ROM)
+
+    for name in ( 'pc', 'sp', 'memptr', 'interrupt_cycles' ):
+        assert getattr(cached.cpu, name) == getattr(cold.cpu, name), name
+
+    for name in ( 'frame_nr', 'flash', 'ram' ):
+        assert getattr(cached.dk, name) == getattr(cold.dk, name), name
+
+    file = flash_image(str(tmp_path))
+
+    # a base that is in another flash phase must not matter either
+    later = cached.fork()
+    later.run_frames(7)
+
+    results = [ run(base, file) for base in ( cold, cached, later ) ]
+
+    assert results[0]['screen'] == results[1]['screen'] == results[2]['screen']
+    assert results[0]['registers'] == results[1]['registers'] == results[2]['registers']
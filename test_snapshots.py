@@ -0,0 +1,213 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+# round trips of the snapshot formats, run with: python3 -m pytest -q
+
+import os
+import pytest
+import random
+import struct
+from machine import machine
+from sna import read_sna, write_sna
+from snapshot import REGISTERS, snapshot
+from state import REGISTERS_8, load_state, save_state
+from z80_snapshot import HEADER, compress, decompress, read_z80, write_z80
+
+ROM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zxspectrum', '48.rom')
+
+def random_regs(rng: random.Random) -> dict:
+    regs = { name: rng.randrange(256) for name in REGISTERS }
+
+    for name in ( 'ix', 'iy', 'sp', 'pc' ):
+        regs[name] = rng.randrange(0x10000)
+
+    regs['im'] = rng.randrange(3)
+    regs['iff1'] = regs['iff2'] = regs['interrupts'] = rng.random() < 0.5
+
+    return regs
+
+def random_ram(rng: random.Random) -> bytes:
+    """48kB with the things that compress: runs, 0xed bytes and runs of
+    them, next to random data."""
+    ram = bytearray()
+
+    while len(ram) < 0xc000:
+        kind = rng.randrange(4)
+
+        if kind == 0:
+            ram += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 20)))
+        elif kind == 1:
+            ram += bytes((rng.choice((0x00, 0xed, 0xff, rng.randrange(256))),)) * rng.randrange(1, 600)
+        elif kind == 2:
+            ram += b'\xed' + bytes((rng.randrange(256),)) * rng.randrange(1, 10)
+        else:
+            ram += b'\xed' * rng.randrange(1, 4)
+
+    return bytes(ram[0:0xc000])
+
+def test_compress_edge_cases():
+    cases = {
+        b'\x01' * 4: b'\x01' * 4,
+        b'\x01' * 5: b'\xed\xed\x05\x01',
+        b'\xed': b'\xed',
+        b'\xed\xed': b'\xed\xed\x02\xed',
+        # the byte after a single 0xed is never part of a run
+        b'\xed' + b'\x00' * 5: b'\xed' + b'\x00' * 5,
+        b'\xed' + b'\x00' * 6: b'\xed\x00\xed\xed\x05\x00',
+        # runs are split at 255 bytes, a short rest is literal
+        b'\x07' * 256: b'\xed\xed\xff\x07\x07',
+        b'\x07' * 600: b'\xed\xed\xff\x07\xed\xed\xff\x07\xed\xed\x5a\x07',
+        b'\xed' * 256: b'\xed\xed\xff\xed\xed',
+    }
+
+    for data, expected in cases.items():
+        assert compress(data) == expected, data.hex()
+        assert decompress(expected) == data, data.hex()
+
+def test_compress_round_trip():
+    rng = random.Random(1)
+
+    for _ in range(20):
+        data = random_ram(rng)[0:rng.randrange(1, 0x4000)]
+        assert decompress(compress(data)) == data
+
+def test_decompress_end_marker():
+    # 00 ed ed 00 ends version 1 data, its 00 is decoded as a literal
+    assert decompress(b'\x01\x02\xed\xed\x03\x04\x00\xed\xed\x00\x05\x06') == b'\x01\x02\x04\x04\x04\x00'
+
+def test_z80_round_trip():
+    rng = random.Random(2)
+
+    for _ in range(5):
+        s = snapshot(random_regs(rng), random_ram(rng), rng.randrange(8))
+        t = read_z80(write_z80(s))
+
+        assert t.regs == s.regs
+        assert t.ram == s.ram
+        assert t.border == s.border
+        assert t.model == '48k'
+
+def test_z80_version_1():
+    rng = random.Random(3)
+    regs = random_regs(rng)
+    ram = random_ram(rng)
+
+    r = regs
+    header = HEADER.pack(r['a'], r['f'], (r['b'] << 8) | r['c'], (r['h'] << 8) | r['l'],
+                         r['pc'] or 1, r['sp'], r['i'], r['r'] & 0x7f, ((r['r'] >> 7) & 1) | (5 << 1) | 32,
+                         (r['d'] << 8) | r['e'], (r['b_'] << 8) | r['c_'], (r['d_'] << 8) | r['e_'],
+                         (r['h_'] << 8) | r['l_'], r['a_'], r['f_'], r['iy'], r['ix'],
+                         1 if r['interrupts'] else 0, 1 if r['interrupts'] else 0, r['im'])
+
+    s = read_z80(header + compress(ram) + b'\x00\xed\xed\x00')
+
+    assert s.ram == ram
+    assert s.border == 5
+    assert s.regs['sp'] == regs['sp']
+    assert s.regs['r'] == regs['r']
+
+def test_z80_uncompressed_page():
+    # random data does not compress, such pages are stored as they are
+    rng = random.Random(4)
+    ram = bytes(rng.randrange(256) for _ in range(0xc000))
+    data = write_z80(snapshot(random_regs(rng), ram))
+
+    assert struct.pack('<H', 0xffff) in data
+    assert read_z80(data).ram == ram
+
+def test_sna_round_trip():
+    rng = random.Random(5)
+
+    for _ in range(5):
+        regs = random_regs(rng)
+        regs['iff1'] = regs['iff2'] = regs['interrupts']
+
+        # PC goes on the stack, which has to be in RAM
+        regs['sp'] = rng.randrange(0x4002, 0x10000)
+
+        s = snapshot(regs, random_ram(rng), rng.randrange(8))
+        data = write_sna(s)
+        t = read_sna(data)
+
+        assert t.regs == s.regs
+        assert t.border == s.border
+
+        # the copy that is written has PC pushed, the snapshot itself not
+        sp = regs['sp'] - 2
+        assert t.ram[0:sp - 0x4000] == s.ram[0:sp - 0x4000]
+        assert t.ram[sp - 0x4000 + 2:] == s.ram[sp - 0x4000 + 2:]
+        assert t.ram[sp - 0x4000] | (t.ram[sp - 0x4000 + 1] << 8) == regs['pc']
+        assert write_sna(t) == data
+
+def random_machine(rng: random.Random) -> machine:
+    m = machine(ROM)
+    cpu, dk = m.cpu, m.dk
+
+    for name in REGISTERS_8:
+        setattr(cpu, name, rng.randrange(3 if name == 'im' else 256))
+
+    for name in ( 'ix', 'iy', 'sp', 'pc', 'memptr' ):
+        setattr(cpu, name, rng.randrange(0x10000))
+
+    cpu.iff1 = rng.randrange(2)
+    cpu.iff2 = rng.randrange(2)
+    cpu.interrupts = rng.random() < 0.5
+    cpu.int = rng.random() < 0.5
+    cpu.interrupt_cycles = rng.randrange(69888)
+
+    ram = random_ram(rng)
+    dk.load(ram[0:0x1b00])
+    dk.border = rng.randrange(8)
+    dk.ear = rng.randrange(2)
+    dk.flash = rng.randrange(2)
+    dk.frame_nr = rng.randrange(1 << 32)
+    dk.set_keys(bytes(rng.randrange(32) for _ in range(8)))
+    m.ram_.load(ram[0x1b00:])
+
+    return m
+
+def test_state_round_trip():
+    rng = random.Random(6)
+
+    for _ in range(3):
+        a = random_machine(rng)
+        blob = save_state(a.cpu, a.dk, a.ram_)
+
+        b = machine(ROM)
+        b.dk.ear_log = [ 1234 ]
+        load_state(b.cpu, b.dk, b.ram_, blob)
+
+        # the beeper continues from the restored EAR level
+        assert b.dk.ear_log == []
+        assert b.dk.ear_start == a.dk.ear
+
+        for name in REGISTERS_8 + ( 'ix', 'iy', 'sp', 'pc', 'memptr', 'iff1', 'iff2', 'interrupts', 'int', 'interrupt_cycles' ):
+            assert getattr(b.cpu, name) == getattr(a.cpu, name), name
+
+        for name in ( 'ram', 'border', 'ear', 'flash', 'frame_nr', 'keys' ):
+            assert getattr(b.dk, name) == getattr(a.dk, name), name
+
+        assert b.ram_.dump() == a.ram_.dump()
+        assert save_state(b.cpu, b.dk, b.ram_) == blob
+
+def test_state_rejects():
+    m = machine(ROM)
+    blob = save_state(m.cpu, m.dk, m.ram_)
+
+    for bad in ( b'XXXX' + blob[4:], blob[0:4] + b'\xff\xff' + blob[6:], blob[:-1] ):
+        with pytest.raises(ValueError):
+            load_state(m.cpu, m.dk, m.ram_, bad)
+
+def test_snapshot_apply_resets_frame_state():
+    rng = random.Random(7)
+    m = random_machine(rng)
+    m.dk.border_log = [ (100, 3) ]
+    m.dk.ear_log = [ 200 ]
+
+    s = snapshot(random_regs(rng), random_ram(rng), 4)
+    s.apply(m.cpu, m.dk, m.ram_)
+
+    assert (m.cpu.interrupt_cycles, m.cpu.int, m.cpu.memptr) == (0, False, 0)
+    assert (m.dk.frame_nr, m.dk.flash) == (0, 0)
+    assert (m.dk.border, m.dk.border_start, m.dk.border_log) == (4, 4, [])
+    assert (m.dk.ear, m.dk.ear_start, m.dk.ear_log) == (0, 0, [])
@@ -0,0 +1,76 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+from typing import Dict, List, Optional
+
+# character set of the 48k ROM: 8 bytes for each of ' '...'©'
+CHARSET: int = 0x3d00
+
+# system variable pointing to the 21 user defined graphics (A...U)
+UDG: int = 23675
+
+# characters that differ from ASCII
+SPECIAL = { 0x5e: '↑', 0x60: '£', 0x7f: '©' }
+
+# block graphics 0x80...0x8f: bit 0 top right, 1 top left, 2 bottom right,
+# 3 bottom left
+BLOCKS = ' ▝▘▀▗▐▚▜▖▞▌▛▄▟▙█'
+
+UNKNOWN = '?'
+
+# glyph (8 bytes, top to bottom) to character, per ROM image
+charsets: Dict[str, Dict[bytes, str]] = {}
+
+def charset(rom: bytes, sha256: str) -> Dict[bytes, str]:
+    glyphs = charsets.get(sha256)
+
+    if glyphs is None:
+        glyphs = {}
+
+        for i in range(96):
+            glyph = bytes(rom[CHARSET + i * 8:CHARSET + i * 8 + 8])
+            glyphs.setdefault(glyph, SPECIAL.get(32 + i, chr(32 + i)))
+
+        for i, c in enumerate(BLOCKS):
+            top = (0xf0 if i & 2 else 0) | (0x0f if i & 1 else 0)
+            bottom = (0xf0 if i & 8 else 0) | (0x0f if i & 4 else 0)
+            glyphs.setdefault(bytes((top,) * 4 + (bottom,) * 4), c)
+
+        # INVERSE 1 (and the cursor) print the glyph inverted
+        for glyph, c in list(glyphs.items()):
+            glyphs.setdefault(bytes(v ^ 0xff for v in glyph), c)
+
+        charsets[sha256] = glyphs
+
+    return glyphs
+
+class text_screen:
+    """Reads the 32x24 characters on the screen by looking up the bitmap
+    of each cell in a glyph table. The bitmap of every text row is kept,
+    only rows that changed since the previous decode are looked up again."""
+
+    def __init__(self, glyphs: Dict[bytes, str]):
+        self.glyphs = glyphs
+        self.rows: List[Optional[bytes]] = [ None ] * 24
+        self.lines: List[str] = [ ' ' * 32 ] * 24
+
+    def set_glyphs(self, glyphs: Dict[bytes, str]) -> None:
+        if glyphs is not self.glyphs and glyphs != self.glyphs:
+            self.glyphs = glyphs
+            self.rows = [ None ] * 24
+
+    def decode(self, vram) -> List[str]:
+        glyphs = self.glyphs
+
+        for y in range(24):
+            base = ((y & 0x18) << 8) | ((y & 7) << 5)
+
+            # the 8 pixel lines of this text row, 32 bytes each
+            row = b''.join([ vram[base + (line << 8):base + (line << 8) + 32] for line in range(8) ])
+            if row == self.rows[y]:
+                continue
+
+            self.rows[y] = row
+            self.lines[y] = ''.join([ glyphs.get(row[x::32], UNKNOWN) for x in range(32) ])
+
+        return self.lines
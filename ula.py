@@ -0,0 +1,205 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+from collections import deque
+from frame_ring import frame_ring
+from typing import Callable, Dict, List, Optional
+
+# events posted by the display backend: key changes are encoded as
+# (half-row << 4) | (bit << 1) | pressed
+EV_MENU: int = 0x100
+EV_SAVE: int = 0x101
+EV_REWIND: int = 0x102
+EV_QUIT: int = 0x103
+EV_REWIND_END: int = 0x104
+
+class ula:
+    """Video memory, border and keyboard port. Completed frames are handed
+    to the display backend through a frame ring, the backend posts key
+    changes into a queue which is processed between frames."""
+
+    def __init__(self, display, governor, accurate: bool = False):
+        self.display = display
+        self.governor = governor
+
+        # what to do for the non-key events, and what to run at the end of
+        # each frame
+        self.hotkeys: Dict[int, Callable[[], None]] = {}
+        self.frame_handlers: List[Callable[[], None]] = []
+
+        self.ram = bytearray(0x1b00)
+
+        # in accurate mode every video write is logged with its T-state so
+        # that mid-frame changes end up on the right scanlines
+        self.accurate = accurate
+        self.cpu = None
+        self.log: List[tuple] = []
+        self.frame_start = bytearray(0x1b00)
+
+        self.border = 7
+        self.border_start = 7
+        self.border_log: List[tuple] = []
+
+        # the EAR (speaker) bit, the T-state of every change is logged; at
+        # the end of a frame (level at its start, log) is moved to ear_frame
+        # for the frame handlers (see beeper.py)
+        self.ear = 0
+        self.ear_start = 0
+        self.ear_log: List[int] = []
+        self.ear_frame: tuple = (0, [])
+
+        # pressed keys per half-row (bit set = pressed) and the resulting
+        # port value per half-row selection, filled on demand
+        self.keys = bytearray(8)
+        self.kb_cache: List[Optional[int]] = [ None ] * 256
+        self.events: deque = deque()
+
+        self.ring = frame_ring()
+        self.frame_nr = 0
+        self.flash = 0
+        self.refresh = False
+
+        # 'changed' is set by anything that changes the picture, at the end
+        # of such a frame the generation is incremented: consumers compare
+        # it with what they saw last to skip static frames
+        self.changed = False
+        self.generation = 0
+
+    def get_name(self):
+        return 'ULA'
+
+    def interrupt(self):
+        while self.events:
+            event = self.events.popleft()
+
+            if event in self.hotkeys:
+                self.hotkeys[event]()
+
+            elif event < EV_MENU:
+                self.key(event >> 4, (event >> 1) & 7, event & 1)
+
+        self.frame_nr += 1
+        if (self.frame_nr & 15) == 0:
+            self.flash ^= 1
+            self.changed = True
+
+        if self.changed:
+            self.changed = False
+            self.generation += 1
+            self.refresh = True
+
+        render = self.governor.frame()
+
+        if self.refresh and render:
+            # frames drawn from a log differ from the next, unchanged, frame
+            self.refresh = len(self.log) > 0 or len(self.border_log) > 0
+
+            self.ring.publish(self.frame_start if self.log else self.ram, self.log, self.border_start, self.border_log, self.flash, self.frame_nr)
+
+        if self.log:
+            self.frame_start[:] = self.ram
+            self.log = []
+
+        self.border_start = self.border
+        self.border_log = []
+
+        self.ear_frame = (self.ear_start, self.ear_log)
+        self.ear_start = self.ear
+        self.ear_log = []
+
+        for handler in self.frame_handlers:
+            handler()
+
+    def IE0(self) -> bool:
+        return True
+
+    def start(self):
+        self.display.start(self.ring, self.events)
+
+    def write_mem(self, a: int, v: int) -> None:
+        assert a >= 0x4000 and a < 0x5b00
+        if self.ram[a - 0x4000] == v:
+            return
+
+        self.ram[a - 0x4000] = v
+        self.changed = True
+
+        if self.accurate:
+            self.log.append((self.cpu.interrupt_cycles, a - 0x4000, v))
+
+    def load(self, data: bytes) -> None:
+        """Replaces the complete display file (e.g. from a snapshot)."""
+        self.ram[:] = data
+        self.frame_start[:] = data
+        self.log = []
+        self.changed = True
+
+    def fork(self, display, governor) -> 'ula':
+        """Returns a ULA in the same state, presenting to 'display'. Hotkeys
+        and frame handlers are not inherited."""
+        child = ula(display, governor, self.accurate)
+        child.ram[:] = self.ram
+        child.frame_start[:] = self.frame_start
+        child.log = list(self.log)
+        child.border = self.border
+        child.border_start = self.border_start
+        child.border_log = list(self.border_log)
+        child.ear = self.ear
+        child.ear_start = self.ear_start
+        child.ear_log = list(self.ear_log)
+        child.keys[:] = self.keys
+        child.frame_nr = self.frame_nr
+        child.flash = self.flash
+        child.generation = self.generation
+        child.changed = True
+
+        return child
+
+    def write_io(self, a: int, v: int) -> None:
+        border = v & 7
+        if border != self.border:
+            self.border = border
+            self.border_log.append((self.cpu.interrupt_cycles, border))
+            self.changed = True
+
+        ear = (v >> 4) & 1
+        if ear != self.ear:
+            self.ear = ear
+            self.ear_log.append(self.cpu.interrupt_cycles)
+
+    def read_mem(self, a: int) -> int:
+        assert a >= 0x4000 and a < 0x5b00
+        return self.ram[a - 0x4000]
+
+    def key(self, row: int, bit: int, pressed: bool) -> None:
+        if pressed:
+            self.keys[row] |= 1 << bit
+        else:
+            self.keys[row] &= ~(1 << bit)
+
+        self.kb_cache = [ None ] * 256
+
+    def set_keys(self, keys: bytes) -> None:
+        """Replaces the pressed bits of all 8 half-rows at once."""
+        keys = bytes(keys)
+        if keys != self.keys:
+            self.keys[:] = keys
+            self.kb_cache = [ None ] * 256
+
+    def read_io(self, a: int) -> int:
+        rows = (a >> 8) & 0xff
+
+        v = self.kb_cache[rows]
+        if v is None:
+            v = 0
+            for row in range(8):
+                if (rows & (1 << row)) == 0:
+                    v |= self.keys[row]
+
+            v ^= 0xff
+            self.kb_cache[rows] = v
+
+        return v
+
+    def stop(self):
+        self.display.stop()
@@ -15,6 +15,9 @@ class z80:
 
         self.b16io = b16io
 
+        # 48K ULA: 312 lines of 224 T-states between interrupts
+        self.frame_cycles: int = 69888
+
         self.init_main()
         self.init_xy()
         self.init_xy_bit()
@@ -458,10 +461,10 @@ class z80:
         self.main_jumps[0xff] = self._rst
 
     def step(self):
-        if self.interrupt_cycles >= 3579545 / 50:
+        if self.interrupt_cycles >= self.frame_cycles:
             if self.screen.IE0():
                 self.interrupt()
-                self.interrupt_cycles = 0
+                self.interrupt_cycles -= self.frame_cycles
             self.screen.interrupt()
 
         if self.int:
@@ -1914,7 +1917,7 @@ class z80:
         a = self.read_pc_inc()
         old_a = self.a
         self.debug('%04x IN A,(#%02X)' % (self.pc - 2, a))
-        self.a = self.in_(a)
+        self.a = self.in_((old_a << 8) | a) if self.b16io else self.in_(a)
         self.memptr = ((old_a << 8) + a + 1) & 0xffff
         return 11
 
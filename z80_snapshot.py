@@ -0,0 +1,169 @@
+# (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
+# released under MIT license
+
+import re
+import struct
+from snapshot import snapshot
+
+# A, F, BC, HL, PC, SP, I, R, flags, DE, BC', DE', HL', A', F', IY, IX, IFF1, IFF2, flags 2
+HEADER = struct.Struct('<BBHHHHBBBHHHHBBHHBBB')
+
+# PC, hardware mode, last OUT to 0x7ffd (v2/v3 extra header, after its length)
+HEADER_EXT = struct.Struct('<HBB')
+
+# 48k pages of version 2/3 files and where they go
+PAGES_48K = ( (8, 0x4000), (4, 0x8000), (5, 0xc000) )
+
+# sequences of at least 5 equal bytes, or of at least 2 0xed bytes
+RUN = re.compile(rb'(\xed)\1+|(.)\2{4,}', re.DOTALL)
+
+def decompress(data: bytes) -> bytearray:
+    """ED ED nn bb is nn times bb, anything else is taken literally. A run
+    of length 0 marks the end (version 1 files)."""
+    out = bytearray()
+    pos = 0
+
+    while True:
+        i = data.find(b'\xed\xed', pos)
+        if i == -1 or i + 3 >= len(data):
+            out += data[pos:]
+            break
+
+        out += data[pos:i]
+
+        n = data[i + 2]
+        if n == 0:
+            break
+
+        out += bytes((data[i + 3],)) * n
+        pos = i + 4
+
+    return out
+
+def compress(data: bytes) -> bytearray:
+    out = bytearray()
+    pos = 0
+
+    for m in RUN.finditer(data):
+        s, e = m.span()
+        v = data[s]
+
+        out += data[pos:s]
+
+        # the byte following a single 0xed is never part of a run
+        if s > pos and data[s - 1] == 0xed:
+            out.append(v)
+            s += 1
+
+        while e - s >= 5 or (v == 0xed and e - s >= 2):
+            n = min(e - s, 255)
+            out += bytes((0xed, 0xed, n, v))
+            s += n
+
+        # what is left is copied with the next literal span
+        pos = s
+
+    out += data[pos:]
+
+    return out
+
+def read_z80(data: bytes) -> snapshot:
+    (a, f, bc, hl, pc, sp, i, r, flags, de, bc_, de_, hl_, a_, f_, iy, ix, iff1, iff2, flags2) = HEADER.unpack_from(data)
+
+    if flags == 255:
+        flags = 1
+
+    model = '48k'
+    ram = bytearray(0xc000)
+
+    if pc != 0:  # version 1: 48k, optionally compressed as one block
+        block = data[HEADER.size:]
+        if flags & 32:
+            block = decompress(block)
+
+        assert len(block) >= 0xc000, 'truncated .Z80 file'
+        ram[:] = block[0:0xc000]
+
+    else:  # version 2/3
+        ext_len = data[HEADER.size] | (data[HEADER.size + 1] << 8)
+        pc, hw_mode, last_7ffd = HEADER_EXT.unpack_from(data, HEADER.size + 2)
+
+        if hw_mode >= (3 if ext_len == 23 else 4):
+            model = '128k'
+
+        banks = {}
+        pos = HEADER.size + 2 + ext_len
+        while pos + 3 <= len(data):
+            length = data[pos] | (data[pos + 1] << 8)
+            page = data[pos + 2]
+            pos += 3
+
+            if length == 0xffff:
+                block = data[pos:pos + 0x4000]
+                pos += 0x4000
+            else:
+                block = decompress(data[pos:pos + length])
+                pos += length
+
+            assert len(block) == 0x4000, f'page {page} has the wrong size'
+            banks[page] = block
+
+        if model == '128k':
+            # page n is RAM bank n - 3, show what a 48k machine would see
+            layout = ( (5 + 3, 0x4000), (2 + 3, 0x8000), ((last_7ffd & 7) + 3, 0xc000) )
+        else:
+            layout = PAGES_48K
+
+        for page, address in layout:
+            if page in banks:
+                ram[address - 0x4000:address - 0x4000 + 0x4000] = banks[page]
+
+    regs = { 'a': a, 'f': f, 'b': bc >> 8, 'c': bc & 255, 'h': hl >> 8, 'l': hl & 255,
+             'pc': pc, 'sp': sp, 'i': i, 'r': (r & 0x7f) | ((flags & 1) << 7),
+             'd': de >> 8, 'e': de & 255, 'b_': bc_ >> 8, 'c_': bc_ & 255,
+             'd_': de_ >> 8, 'e_': de_ & 255, 'h_': hl_ >> 8, 'l_': hl_ & 255,
+             'a_': a_, 'f_': f_, 'iy': iy, 'ix': ix, 'im': flags2 & 3,
+             'iff1': iff1 != 0, 'iff2': iff2 != 0, 'interrupts': iff1 != 0 }
+
+    s = snapshot(regs, bytes(ram), (flags >> 1) & 7)
+    s.model = model
+
+    return s
+
+def write_z80(s: snapshot) -> bytes:
+    """Writes a version 3 48k file with compressed pages."""
+    r = s.regs
+
+    header = HEADER.pack(r['a'], r['f'], (r['b'] << 8) | r['c'], (r['h'] << 8) | r['l'],
+                         0, r['sp'], r['i'], r['r'] & 0x7f, ((r['r'] >> 7) & 1) | (s.border << 1),
+                         (r['d'] << 8) | r['e'], (r['b_'] << 8) | r['c_'], (r['d_'] << 8) | r['e_'],
+                         (r['h_'] << 8) | r['l_'], r['a_'], r['f_'], r['iy'], r['ix'],
+                         1 if r['interrupts'] else 0, 1 if r['iff2'] or r['interrupts'] else 0, r['im'] & 3)
+
+    ext = bytearray(54)
+    HEADER_EXT.pack_into(ext, 0, r['pc'], 0, 0)
+
+    out = bytearray(header)
+    out += struct.pack('<H', len(ext))
+    out += ext
+
+    for page, address in PAGES_48K:
+        block = s.ram[address - 0x4000:address - 0x4000 + 0x4000]
+        compressed = compress(block)
+
+        if len(compressed) < 0x4000:
+            out += struct.pack('<HB', len(compressed), page)
+            out += compressed
+        else:
+            out += struct.pack('<HB', 0xffff, page)
+            out += block
+
+    return bytes(out)
+
+def load_z80(file: str) -> snapshot:
+    with open(file, 'rb') as fh:
+        return read_z80(fh.read())
+
+def save_z80(file: str, s: snapshot) -> None:
+    with open(file, 'wb') as fh:
+        fh.write(write_z80(s))
@@ -3,281 +3,168 @@
 # (C) 2023 by Folkert van Heusden <mail@vanheusden.com>
 # released under MIT license
 
+import os
 import sys
-import threading
-import time
+from machine import machine
 from optparse import OptionParser
-from ram import ram
-from rom import rom
-from screen_kb_zx_s import screen_kb_zx_s
-from typing import Callable, List
-from z80 import z80
+from rewind import rewind
+from snapshot_cache import load_snapshot
+from state import load_state, save_state
+from ula import EV_MENU, EV_REWIND, EV_REWIND_END, EV_SAVE
+
+def parse_options():
+    parser = OptionParser()
+    parser.add_option('-r', '--rom', dest='rom_file', help='select ROM')
+    parser.add_option('-S', '--sna', dest='sna_file', help='select .SNA file to load (when F10 is pressed)')
+    parser.add_option('-Z', '--z80', dest='z80_file', help='select .Z80 file to load (when F10 is pressed)')
+    parser.add_option('-L', '--load', dest='load_file', help='.SNA, .Z80 or .state file to start with instead of booting the ROM (again when F10 is pressed)')
+    parser.add_option('-c', '--cold-boot', dest='cold_boot', action='store_true', default=False, help='boot the ROM instead of restoring its cached post-boot state')
+    parser.add_option('-q', '--quick-save', dest='quick_save_file', default='quicksave.sna', help='.SNA, .Z80 or .state file to write when F9 is pressed')
+    parser.add_option('-w', '--rewind', dest='rewind', type='float', default=0, help='keep this many seconds of history, holding F8 goes back through it')
+    parser.add_option('-m', '--shared-memory', dest='shared_memory', help='publish screen and memory after every frame in shared memory with this name')
+    parser.add_option('-M', '--shared-file', dest='shared_file', help='publish screen and memory after every frame in this (mmap\'d) file')
+    parser.add_option('-R', '--record', dest='record', help='record the video to this .y4m, .rgb (raw RGB24) or .png (numbered) file, - is Y4M on stdout')
+    parser.add_option('-A', '--audio', dest='audio', help='play the beeper (pygame) or write it to this .wav or raw (signed 16 bit mono) file, - is raw on stdout')
+    parser.add_option('-H', '--sample-rate', dest='sample_rate', type='int', default=44100, help='audio sample rate, e.g. 44100 or 48000')
+    parser.add_option('-l', '--debug-log', dest='debug_log', help='logfile to write to (optional)')
+    parser.add_option('-a', '--accurate', dest='accurate', action='store_true', default=False, help='scanline accurate rendering of mid-frame video writes')
+    parser.add_option('-t', '--turbo', dest='turbo', action='store_true', default=False, help='run as fast as possible instead of at 50Hz')
+    parser.add_option('-d', '--render-divisor', dest='render_divisor', type='int', default=1, help='only render every n-th frame')
+    parser.add_option('-b', '--backend', dest='backend', default='pygame', help='display backend: pygame, terminal or null (headless)')
+    parser.add_option('-s', '--scale', dest='scale', type='int', default=2, help='window size multiplier')
+    parser.add_option('-f', '--fullscreen', dest='fullscreen', action='store_true', default=False, help='run fullscreen')
+    return parser.parse_args()
+
+def main() -> None:
+    (options, args) = parse_options()
+
+    if not options.rom_file:
+        print('No BIOS/BASIC ROM selected (e.g. 48.rom)')
+        sys.exit(1)
+
+    def debug(x):
+        if options.debug_log:
+            fh = open(options.debug_log, 'a+')
+            fh.write('%s\n' % x)
+            fh.close()
+
+    if options.record == '-' or options.audio == '-':
+        # keep the messages (also those of pygame) out of the stream
+        os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+        sys.stdout = sys.stderr
+
+    if options.backend == 'null':
+        from screen_null import screen_null
+        display = screen_null()
+
+    elif options.backend == 'terminal':
+        from screen_terminal import screen_terminal
+        display = screen_terminal()
+
+    elif options.backend == 'pygame':
+        from screen_kb_zx_s import screen_kb_zx_s
+        display = screen_kb_zx_s(options.scale, options.fullscreen)
 
-abort_time = None # 60
+    else:
+        print(f'Unknown display backend {options.backend}')
+        sys.exit(1)
 
-debug_log = None
+    m = machine(options.rom_file, display, options.turbo, options.render_divisor, options.accurate, debug)
 
-io_values: List[int] = [ 0 ] * 65536
-io_read: List[Callable[[int], int]] = [ None ] * 65536
-io_write: List[Callable[[int, int], None]] = [ None ] * 65536
-
-def debug(x):
-    # dk.debug('%s' % x)
-
-    if debug_log:
-        fh = open(debug_log, 'a+')
-        fh.write('%s\n' % x)
-        fh.close()
-
-parser = OptionParser()
-parser.add_option('-r', '--rom', dest='rom_file', help='select ROM')
-parser.add_option('-S', '--sna', dest='sna_file', help='select .SNA file to load (when F10 is pressed)')
-parser.add_option('-Z', '--z80', dest='z80_file', help='select .Z80 file to load (when F10 is pressed)')
-parser.add_option('-l', '--debug-log', dest='debug_log', help='logfile to write to (optional)')
-(options, args) = parser.parse_args()
-
-debug_log = options.debug_log
-
-if not options.rom_file:
-    print('No BIOS/BASIC ROM selected (e.g. 48.rom)')
-    sys.exit(1)
-
-def read_byte(fh):
-    b = fh.read(1)
-    assert b != None
-    i = int.from_bytes(b, "big")
-    assert i >= 0 and i < 256
-    return i
-
-def read_word(fh):
-    return read_byte(fh) | (read_byte(fh) << 8)
-
-def menu():
-    global cpu
-    global dk
-    global ram_
-
-    if options.sna_file != None:
-        fh = open(options.sna_file, 'rb')
-
-        print('Loading registers...')
-
-        cpu.i = read_byte(fh)
-
-        cpu.l_ = read_byte(fh)
-        cpu.h_ = read_byte(fh)
-        cpu.e_ = read_byte(fh)
-        cpu.d_ = read_byte(fh)
-        cpu.c_ = read_byte(fh)
-        cpu.b_ = read_byte(fh)
-        cpu.f_ = read_byte(fh)
-        cpu.a_ = read_byte(fh)
-
-        cpu.l = read_byte(fh)
-        cpu.h = read_byte(fh)
-        cpu.e = read_byte(fh)
-        cpu.d = read_byte(fh)
-        cpu.c = read_byte(fh)
-        cpu.b = read_byte(fh)
-        cpu.iy = read_word(fh)
-        cpu.ix = read_word(fh)
-
-        cpu.interrupts = (read_byte(fh) & 1) == 1
-
-        cpu.r = read_byte(fh)
-
-        cpu.f = read_byte(fh)
-        cpu.a = read_byte(fh)
-        cpu.sp = read_word(fh)
-
-        read_byte(fh)  # intmode
-        read_byte(fh)  # border color
-
-        print('Loading video ram...')
-        for i in range(0x4000, 0x5b00):
-            dk.write_mem(i, read_byte(fh))
-
-        print('Loading main ram...')
-        for i in range(0x5b00, 0x10000):
-            ram_.write_mem(i, read_byte(fh))
- 
-        fh.close()
-
-        cpu.retn()
-
-        print(f'File {options.sna_file} loaded into RAM')
-
-    if options.z80_file != None:
-        fh = open(options.z80_file, 'rb')
-
-        print('Loading header...')
-
-        cpu.a = read_byte(fh)
-        cpu.f = read_byte(fh)
-        cpu.c = read_byte(fh)
-        cpu.b = read_byte(fh)
-        cpu.l = read_byte(fh)
-        cpu.h = read_byte(fh)
-        cpu.pc = read_word(fh)
-        print(f'PC: {cpu.pc:04x}')
-        cpu.sp = read_word(fh)
-        print(f'SP: {cpu.sp:04x}')
-        cpu.i = read_byte(fh)
-        cpu.r = read_byte(fh)
-        meta = read_byte(fh)
-        if meta == 255:
-            meta = 1
-        cpu.e = read_byte(fh)
-        cpu.d = read_byte(fh)
-        cpu.c_ = read_byte(fh)
-        cpu.b_ = read_byte(fh)
-        cpu.e_ = read_byte(fh)
-        cpu.d_ = read_byte(fh)
-        cpu.l_ = read_byte(fh)
-        cpu.h_ = read_byte(fh)
-        cpu.a_ = read_byte(fh)
-        cpu.f_ = read_byte(fh)
-        cpu.iy = read_word(fh)
-        cpu.ix = read_word(fh)
-        cpu.interrupts = (read_byte(fh) & 1) == 1
-        read_byte(fh)  # iff2
-        read_byte(fh)  # 29
-
-        if cpu.pc == 0x0000:  # version 2/3
-            print('Loading version 2/3 header...')
-            # TODO
-
-            while True:
-                compressed_length = read_word(fh)
-                page_number = read_byte(fh)
-                print(f'Loading page {page_number}')
-                if compressed_length == 0xffff:
-                    print('Uncompressed')
-                    # TODO read 16kB
-                    pass
-                else:
-                    print('Compressed')
-                    # uncompress
-                    pass
-                break
-        else:
-            if meta & 32:
-                print('Compressed 48k follows')
-                stream = []
-                bp = None
-                while True:
-                    bc = read_byte(fh)
-                    if bc == 0xed:
-                        if bp == 0xed:
-                            n = read_byte(fh)
-                            by_what = read_byte(fh)
-                            if n == 0:
-                                assert stream.pop() == 0
-                                break
-                            for i in range(n):
-                                stream.append(by_what)
-                            bp = None
-                        else:
-                            bp = bc
-                    else:
-                        if bp == 0xed:
-                            stream.append(bp)
-                        stream.append(bc)
-                        bp = None
-                assert len(stream)==(48*1024)
-
-                print('Loading video ram...')
-                for i in range(0x4000, 0x5b00):
-                    dk.write_mem(i, stream[i - 0x4000])
-
-                print('Loading main ram...')
-                for i in range(0x5b00, 0x10000):
-                    ram_.write_mem(i, stream[i - 0x4000])
-            else:
-                print('Uncompressed 48k follows')
+    def load(file: str) -> None:
+        m.load(file)
+        print(f'File {file} loaded')
 
-                print('Loading video ram...')
-                for i in range(0x4000, 0x5b00):
-                    dk.write_mem(i, read_byte(fh))
+    def quick_save():
+        m.save(options.quick_save_file)
+        print(f'Saved snapshot to {options.quick_save_file}')
 
-                print('Loading main ram...')
-                for i in range(0x5b00, 0x10000):
-                    ram_.write_mem(i, read_byte(fh))
+    def menu():
+        for file in (options.sna_file, options.z80_file, options.load_file):
+            if file != None:
+                load(file)
 
-        print(f'Finished loading {options.z80_file}')
+    m.dk.hotkeys[EV_MENU] = menu
+    m.dk.hotkeys[EV_SAVE] = quick_save
 
-        fh.close()
+    if options.rewind > 0:
+        history = rewind(options.rewind)
 
-rom = rom(options.rom_file, debug, 0x0000)
-ram_ = ram(debug)
-dk = screen_kb_zx_s(io_values, menu)
+        # the state that was restored last: while F8 is held the machine
+        # stays there once the history is used up
+        oldest = []
 
-def read_mem(a: int) -> int:
-    assert a >= 0
-    assert a < 0x10000
+        def step_back():
+            state = history.pop()
+            if state:
+                oldest[:] = [ state ]
 
-    if a < 0x4000:  # ROM
-        return rom.read_mem(a)
+            if oldest:
+                load_state(m.cpu, m.dk, m.ram_, oldest[0])
 
-    if a < 0x5b00:  # Video RAM
-        return dk.read_mem(a)
+        def rewind_frame():
+            if history.rewinding:
+                step_back()
+            else:
+                history.frame(lambda: save_state(m.cpu, m.dk, m.ram_))
 
-    return ram_.read_mem(a)
+        def rewind_start():
+            history.rewinding = True
+            oldest.clear()
 
-def write_mem(a: int, v: int) -> None:
-    assert a >= 0
-    assert a < 0x10000
+        def rewind_end():
+            # F8 released within the frame it was pressed in
+            if not oldest:
+                step_back()
 
-    if a < 0x4000:  # ROM
-        return  # cannot write ROM
+            history.rewinding = False
 
-    if a < 0x5b00:  # Video RAM
-        dk.write_mem(a, v)
-        return
+        m.dk.frame_handlers.append(rewind_frame)
+        m.dk.hotkeys[EV_REWIND] = rewind_start
+        m.dk.hotkeys[EV_REWIND_END] = rewind_end
 
-    ram_.write_mem(a, v)
+    shared = None
+    if options.shared_memory or options.shared_file:
+        shared = m.share(options.shared_memory, options.shared_file)
+        print(f'Screen and memory are published in {shared.name}')
 
-def terminator(a: int, v: int) -> None:
-    global stop_flag
+    video = None
+    if options.record:
+        video = m.record(options.record)
 
-    if a == 0:
-        stop_flag = True
+    audio = None
+    if options.audio:
+        audio = m.sound(None if options.audio == 'pygame' else options.audio, options.sample_rate)
 
-def read_io(a: int) -> int:
-    value = 0
+    # parse the snapshots now so that F10 is instant
+    for file in (options.sna_file, options.z80_file):
+        if file != None:
+            load_snapshot(file)
 
-    if (a & 1) == 0:
-        value = dk.read_io(a)
+    if options.load_file:
+        load(options.load_file)
     else:
-        print('I/O read %04x: %02x' % (a, value))
-
-    return value
- 
-def write_io(a: int, v: int) -> None:
-    if (a & 1) == 0:
-        dk.write_io(a, v)
+        m.boot(options.cold_boot)
 
-stop_flag = False
+    m.dk.start()
 
-def cpu_thread():
-    while not stop_flag:
-        cpu.step()
+    try:
+        m.run()
 
-cpu = z80(read_mem, write_mem, read_io, write_io, True, debug, dk)
+    except KeyboardInterrupt:
+        pass
 
-#t = threading.Thread(target=cpu_thread)
-#t.start()
-cpu_thread()
+    finally:
+        m.dk.stop()
 
-if abort_time:
-    time.sleep(abort_time)
-    stop_flag = True
+        if shared:
+            shared.close()
 
-try:
-    t.join()
+        if video:
+            video.close()
 
-except KeyboardInterrupt:
-    stop_flag = True
-    t.join()
+        if audio:
+            audio.close()
 
-dk.stop()
+if __name__ == '__main__':
+    main()